@@ -0,0 +1,42 @@
+"""database generated ids
+
+Revision ID: 3f1c9a7e2b54
+Revises: d8f75a1dbf4b
+Create Date: 2026-10-17 09:12:41.208113
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c9a7e2b54'
+down_revision: str | Sequence[str] | None = 'd8f75a1dbf4b'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+TABLES = ['member', 'trainer', 'class']
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite already hands out INTEGER PRIMARY KEY values from the rowid
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        # Replace any SERIAL default with an identity column and start it past the ids the API assigned by hand
+        op.execute(f'ALTER TABLE "{table}" ALTER COLUMN id DROP DEFAULT')
+        op.execute(f'DROP SEQUENCE IF EXISTS "{table}_id_seq"')
+        op.execute(f'ALTER TABLE "{table}" ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY')
+        op.execute(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), COALESCE((SELECT MAX(id) FROM \"{table}\"), 0) + 1, false)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.execute(f'ALTER TABLE "{table}" ALTER COLUMN id DROP IDENTITY IF EXISTS')
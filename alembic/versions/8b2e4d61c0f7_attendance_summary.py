@@ -0,0 +1,36 @@
+"""attendance summary
+
+Revision ID: 8b2e4d61c0f7
+Revises: 3f1c9a7e2b54
+Create Date: 2026-10-17 11:03:15.662904
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d61c0f7'
+down_revision: str | Sequence[str] | None = '3f1c9a7e2b54'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('attendance_summary',
+    sa.Column('class_id', sa.Integer(), nullable=False),
+    sa.Column('attendance_total', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['class_id'], ['class.id'], ),
+    sa.PrimaryKeyConstraint('class_id')
+    )
+    # Backfill from the existing attendance rows
+    op.execute('INSERT INTO attendance_summary (class_id, attendance_total) SELECT class_id, COUNT(member_id) FROM attendance GROUP BY class_id')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('attendance_summary')
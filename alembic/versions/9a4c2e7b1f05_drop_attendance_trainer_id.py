@@ -0,0 +1,35 @@
+"""drop attendance trainer id
+
+Revision ID: 9a4c2e7b1f05
+Revises: c6f2d8a41e93
+Create Date: 2026-10-17 22:01:37.240518
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4c2e7b1f05'
+down_revision: str | Sequence[str] | None = 'c6f2d8a41e93'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # d8f75a1dbf4b added a NOT NULL attendance.trainer_id that models.py never had, so no check-in could insert
+    if 'trainer_id' in [column['name'] for column in sa.inspect(op.get_bind()).get_columns('attendance')]:
+        with op.batch_alter_table('attendance') as batch_op:
+            batch_op.drop_column('trainer_id')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Back as nullable, since the rows have no trainer to fill it with; d8f75a1dbf4b's downgrade drops it
+    with op.batch_alter_table('attendance') as batch_op:
+        batch_op.add_column(sa.Column('trainer_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('attendance_trainer_id_fkey', 'trainer', ['trainer_id'], ['id'])
@@ -0,0 +1,33 @@
+"""name search indexes
+
+Revision ID: a7c4e09b13d2
+Revises: f2a8c3d95e17
+Create Date: 2026-10-17 19:08:12.530417
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c4e09b13d2'
+down_revision: str | Sequence[str] | None = 'f2a8c3d95e17'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # text_pattern_ops lets Postgres serve LIKE 'prefix%' from the index under any collation
+    expression = 'lower(name) text_pattern_ops' if op.get_bind().dialect.name == 'postgresql' else 'lower(name)'
+    op.create_index('ix_member_name_lower', 'member', [sa.text(expression)], unique=False)
+    op.create_index('ix_class_name_lower', 'class', [sa.text(expression)], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_class_name_lower', table_name='class')
+    op.drop_index('ix_member_name_lower', table_name='member')
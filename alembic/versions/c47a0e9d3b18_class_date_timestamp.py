@@ -0,0 +1,71 @@
+"""class date timestamp
+
+Revision ID: c47a0e9d3b18
+Revises: 8b2e4d61c0f7
+Create Date: 2026-10-17 13:41:52.019377
+
+"""
+from datetime import datetime
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47a0e9d3b18'
+down_revision: str | Sequence[str] | None = '8b2e4d61c0f7'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# Formats the free-form date strings have been entered in, tried after ISO 8601
+DATE_FORMATS = ['%m/%d/%Y %H:%M', '%m/%d/%Y %I:%M %p', '%m/%d/%Y', '%m-%d-%Y', '%d %B %Y', '%B %d, %Y']
+
+
+def parse_date(value: str) -> datetime | None:
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    return None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('class', sa.Column('date_ts', sa.DateTime(), nullable=True))
+
+    connection = op.get_bind()
+    rows = connection.execute(sa.text('SELECT id, date FROM "class"')).all()
+    parsed = {row.id: parse_date(row.date) for row in rows}
+    unparseable = {row.id: row.date for row in rows if parsed[row.id] is None}
+    if unparseable:
+        raise ValueError(f'Cannot convert class dates to timestamps, fix these rows first: {unparseable}')
+    if parsed:
+        connection.execute(sa.text('UPDATE "class" SET date_ts = :date_ts WHERE id = :id'), [{'id': id, 'date_ts': date_ts} for id, date_ts in parsed.items()])
+
+    with op.batch_alter_table('class') as batch_op:
+        batch_op.drop_column('date')
+        batch_op.alter_column('date_ts', new_column_name='date', existing_type=sa.DateTime(), nullable=False)
+    op.create_index(op.f('ix_class_date'), 'class', ['date'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_class_date'), table_name='class')
+    op.add_column('class', sa.Column('date_str', sqlmodel.sql.sqltypes.AutoString(), nullable=True))
+
+    connection = op.get_bind()
+    rows = connection.execute(sa.text('SELECT id, date FROM "class"')).all()
+    if rows:
+        connection.execute(sa.text('UPDATE "class" SET date_str = :date_str WHERE id = :id'), [{'id': row.id, 'date_str': row.date if isinstance(row.date, str) else row.date.isoformat()} for row in rows])
+
+    with op.batch_alter_table('class') as batch_op:
+        batch_op.drop_column('date')
+        batch_op.alter_column('date_str', new_column_name='date', existing_type=sa.String(), nullable=False)
@@ -0,0 +1,59 @@
+"""updated at
+
+Revision ID: c6f2d8a41e93
+Revises: b3e91f6c2a58
+Create Date: 2026-10-17 21:32:05.118273
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6f2d8a41e93'
+down_revision: str | Sequence[str] | None = 'b3e91f6c2a58'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+TABLES = ['member', 'trainer', 'class']
+
+
+def restore_name_indexes() -> None:
+    # SQLite's table copy drops expression indexes, so a7c4e09b13d2's indexes on member and class go with it
+    if op.get_bind().dialect.name == 'sqlite':
+        op.create_index('ix_member_name_lower', 'member', [sa.text('lower(name)')], unique=False, if_not_exists=True)
+        op.create_index('ix_class_name_lower', 'class', [sa.text('lower(name)')], unique=False, if_not_exists=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite can't add a column with a non-constant default, so it goes in nullable and gets its default and
+    # NOT NULL once filled (on SQLite by copying the table). Existing rows are stamped with the time of the
+    # migration, so the first incremental export after it sends everything
+    for table in TABLES:
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f'UPDATE {table} SET updated_at = CURRENT_TIMESTAMP')
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('updated_at', existing_type=sa.DateTime(), server_default=sa.func.now(), nullable=False)
+    restore_name_indexes()
+    op.create_index(op.f('ix_member_updated_at'), 'member', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_trainer_updated_at'), 'trainer', ['updated_at'], unique=False)
+    op.create_index(op.f('ix_class_updated_at'), 'class', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_class_updated_at'), table_name='class')
+    op.drop_index(op.f('ix_trainer_updated_at'), table_name='trainer')
+    op.drop_index(op.f('ix_member_updated_at'), table_name='member')
+    with op.batch_alter_table('class') as batch_op:
+        batch_op.drop_column('updated_at')
+    with op.batch_alter_table('trainer') as batch_op:
+        batch_op.drop_column('updated_at')
+    with op.batch_alter_table('member') as batch_op:
+        batch_op.drop_column('updated_at')
+    restore_name_indexes()
@@ -0,0 +1,55 @@
+"""check-in times and rollups
+
+Revision ID: d41b7e9c05a2
+Revises: 9a4c2e7b1f05
+Create Date: 2026-10-17 22:04:51.603127
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41b7e9c05a2'
+down_revision: str | Sequence[str] | None = '9a4c2e7b1f05'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite can't add a column with a non-constant default, so checked_in_at goes in nullable and gets its
+    # default and NOT NULL once filled (on SQLite by copying the table)
+    op.add_column('attendance', sa.Column('checked_in_at', sa.DateTime(), nullable=True))
+    op.add_column('attendance', sa.Column('source', sqlmodel.sql.sqltypes.AutoString(), server_default='api', nullable=False))
+    # Existing check-ins weren't timed; the class start is the closest there is
+    op.execute("UPDATE attendance SET checked_in_at = (SELECT date FROM class WHERE class.id = attendance.class_id), source = 'backfill'")
+    with op.batch_alter_table('attendance') as batch_op:
+        batch_op.alter_column('checked_in_at', existing_type=sa.DateTime(), server_default=sa.func.now(), nullable=False)
+    op.create_table('attendance_rollup',
+    sa.Column('hour', sa.DateTime(), nullable=False),
+    sa.Column('class_id', sa.Integer(), nullable=False),
+    sa.Column('trainer_id', sa.Integer(), nullable=True),
+    sa.Column('check_ins', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['class_id'], ['class.id'], ),
+    sa.ForeignKeyConstraint(['trainer_id'], ['trainer.id'], ),
+    sa.PrimaryKeyConstraint('hour', 'class_id')
+    )
+    op.create_index(op.f('ix_attendance_rollup_class_id'), 'attendance_rollup', ['class_id'], unique=False)
+    op.create_index('ix_attendance_rollup_trainer_id_hour', 'attendance_rollup', ['trainer_id', 'hour'], unique=False)
+    # Backfill from the existing attendance rows; the SQLite bucket matches how SQLAlchemy stores datetimes there
+    hour = "date_trunc('hour', attendance.checked_in_at)" if op.get_bind().dialect.name == 'postgresql' else "strftime('%Y-%m-%d %H:00:00.000000', attendance.checked_in_at)"
+    op.execute(f'INSERT INTO attendance_rollup (hour, class_id, trainer_id, check_ins) SELECT {hour}, attendance.class_id, class.trainer_id, COUNT(*) FROM attendance JOIN class ON class.id = attendance.class_id GROUP BY {hour}, attendance.class_id, class.trainer_id')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_attendance_rollup_trainer_id_hour', table_name='attendance_rollup')
+    op.drop_index(op.f('ix_attendance_rollup_class_id'), table_name='attendance_rollup')
+    op.drop_table('attendance_rollup')
+    with op.batch_alter_table('attendance') as batch_op:
+        batch_op.drop_column('source')
+        batch_op.drop_column('checked_in_at')
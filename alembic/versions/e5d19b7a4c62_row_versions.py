@@ -0,0 +1,36 @@
+"""row versions
+
+Revision ID: e5d19b7a4c62
+Revises: c47a0e9d3b18
+Create Date: 2026-10-17 15:20:07.384516
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5d19b7a4c62'
+down_revision: str | Sequence[str] | None = 'c47a0e9d3b18'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('member', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('trainer', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('class', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('class') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('trainer') as batch_op:
+        batch_op.drop_column('version')
+    with op.batch_alter_table('member') as batch_op:
+        batch_op.drop_column('version')
@@ -0,0 +1,44 @@
+"""report jobs
+
+Revision ID: e7a3c15f92d6
+Revises: d41b7e9c05a2
+Create Date: 2026-10-17 22:40:18.271846
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3c15f92d6'
+down_revision: str | Sequence[str] | None = 'd41b7e9c05a2'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('report_job',
+    sa.Column('id', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('report', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('params', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('status', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('result', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('error', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_report_job_report_params', 'report_job', ['report', 'params'], unique=False)
+    op.create_index(op.f('ix_report_job_finished_at'), 'report_job', ['finished_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_report_job_finished_at'), table_name='report_job')
+    op.drop_index('ix_report_job_report_params', table_name='report_job')
+    op.drop_table('report_job')
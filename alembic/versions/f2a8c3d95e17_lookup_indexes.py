@@ -0,0 +1,34 @@
+"""lookup indexes
+
+Revision ID: f2a8c3d95e17
+Revises: e5d19b7a4c62
+Create Date: 2026-10-17 15:52:41.208137
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2a8c3d95e17'
+down_revision: str | Sequence[str] | None = 'e5d19b7a4c62'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The (class_id, member_id) primary key can't serve lookups by member_id alone
+    op.create_index(op.f('ix_attendance_member_id'), 'attendance', ['member_id'], unique=False)
+    op.create_index(op.f('ix_class_trainer_id'), 'class', ['trainer_id'], unique=False)
+    op.create_index('ix_member_active', 'member', ['id'], unique=False, postgresql_where=sa.text('active'), sqlite_where=sa.text('active = 1'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_member_active', table_name='member')
+    op.drop_index(op.f('ix_class_trainer_id'), table_name='class')
+    op.drop_index(op.f('ix_attendance_member_id'), table_name='attendance')
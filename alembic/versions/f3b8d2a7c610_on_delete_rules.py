@@ -0,0 +1,53 @@
+"""on delete rules
+
+Revision ID: f3b8d2a7c610
+Revises: e7a3c15f92d6
+Create Date: 2026-10-17 23:12:08.415630
+
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d2a7c610'
+down_revision: str | Sequence[str] | None = 'e7a3c15f92d6'
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+# (table, column, referred table, ON DELETE rule)
+FOREIGN_KEYS = [
+    ('attendance', 'class_id', 'class', 'CASCADE'),
+    ('attendance', 'member_id', 'member', 'CASCADE'),
+    ('class', 'trainer_id', 'trainer', 'SET NULL'),
+    ('attendance_summary', 'class_id', 'class', 'CASCADE'),
+    ('attendance_rollup', 'class_id', 'class', 'CASCADE'),
+    ('attendance_rollup', 'trainer_id', 'trainer', 'SET NULL'),
+]
+# Postgres's default names, which the constraints already have there; SQLite's are unnamed, and batch mode
+# gives them these names when it copies the table so they can be dropped
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def replace_foreign_keys(with_rules: bool) -> None:
+    for table in dict.fromkeys(table for table, _, _, _ in FOREIGN_KEYS):
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            for _, column, referred, rule in [foreign_key for foreign_key in FOREIGN_KEYS if foreign_key[0] == table]:
+                batch_op.drop_constraint(f'{table}_{column}_fkey', type_='foreignkey')
+                batch_op.create_foreign_key(f'{table}_{column}_fkey', referred, [column], ['id'], ondelete=rule if with_rules else None)
+    # SQLite's table copy drops expression indexes, so a7c4e09b13d2's index on class goes with it
+    if op.get_bind().dialect.name == 'sqlite':
+        op.create_index('ix_class_name_lower', 'class', [sa.text('lower(name)')], unique=False, if_not_exists=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    replace_foreign_keys(True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    replace_foreign_keys(False)
@@ -0,0 +1,97 @@
+import asyncio
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import DateTime, bindparam, delete, func, insert, select, text, tuple_, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import engine, upsert
+from models import Attendance, AttendanceRollup, AttendanceSummary, Class
+
+# Every write to Attendance goes through one of these in the same transaction, so the reports can
+# read attendance_summary (totals per class) and attendance_rollup (check-ins per class per hour)
+# instead of scanning Attendance.
+
+def hour_of(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def hour_bucket(dialect: str, column):
+    # hour_of in SQL. SQLite keeps datetimes as text in SQLAlchemy's format, so the bucket is spelled the same way
+    if dialect == "postgresql":
+        return func.date_trunc("hour", column, type_=DateTime)
+    return func.strftime("%Y-%m-%d %H:00:00.000000", column, type_=DateTime)
+
+def day_bucket(dialect: str, column):
+    if dialect == "postgresql":
+        return func.date_trunc("day", column, type_=DateTime)
+    return func.strftime("%Y-%m-%d 00:00:00.000000", column, type_=DateTime)
+
+def rollup_rows(dialect: str):
+    # attendance_rollup rebuilt from Attendance: hour, class_id, trainer_id, check_ins
+    hour = hour_bucket(dialect, Attendance.checked_in_at)
+    return select(hour, Attendance.class_id, Class.trainer_id, func.count()).join(Class, Class.id == Attendance.class_id).group_by(hour, Attendance.class_id, Class.trainer_id)
+
+async def record_check_ins(db: AsyncSession, check_ins: list[tuple[int, datetime]]):
+    # One (class_id, checked_in_at) per newly inserted attendance row
+    if len(check_ins) == 0:
+        return
+    counts = Counter(class_id for class_id, _ in check_ins)
+    statement = upsert(db, AttendanceSummary)
+    statement = statement.on_conflict_do_update(index_elements=[AttendanceSummary.class_id], set_={"attendance_total": AttendanceSummary.__table__.c.attendance_total + statement.excluded.attendance_total})
+    await db.exec(statement, params=[{"class_id": class_id, "attendance_total": count} for class_id, count in counts.items()])
+
+    # The class's trainer is looked up inside the INSERT rather than in a query of its own
+    hours = Counter((hour_of(checked_in_at), class_id) for class_id, checked_in_at in check_ins)
+    statement = upsert(db, AttendanceRollup).values(hour=bindparam("bucket", type_=DateTime), class_id=bindparam("course"), trainer_id=select(Class.trainer_id).where(Class.id == bindparam("course")).scalar_subquery(), check_ins=bindparam("count"))
+    statement = statement.on_conflict_do_update(index_elements=[AttendanceRollup.hour, AttendanceRollup.class_id], set_={"check_ins": AttendanceRollup.__table__.c.check_ins + statement.excluded.check_ins})
+    await db.exec(statement, params=[{"bucket": hour, "course": class_id, "count": count} for (hour, class_id), count in hours.items()])
+
+async def record_removal(db: AsyncSession, class_id: int, checked_in_at: datetime):
+    await db.exec(update(AttendanceSummary).where(AttendanceSummary.class_id == class_id).values(attendance_total=AttendanceSummary.attendance_total - 1))
+    await db.exec(update(AttendanceRollup).where(AttendanceRollup.hour == hour_of(checked_in_at), AttendanceRollup.class_id == class_id).values(check_ins=AttendanceRollup.check_ins - 1))
+
+async def record_member_removals(db: AsyncSession, members):
+    # members is a select of member ids about to be deleted; must run before the delete cascades to their
+    # attendance. Deleted classes need nothing here: their summary and rollup rows go with them.
+    removed = Attendance.member_id.in_(members)
+    removed_per_class = select(func.count()).where(removed, Attendance.class_id == AttendanceSummary.class_id).scalar_subquery()
+    await db.exec(update(AttendanceSummary).where(AttendanceSummary.class_id.in_(select(Attendance.class_id).where(removed))).values(attendance_total=AttendanceSummary.attendance_total - removed_per_class))
+    hour = hour_bucket(db.bind.dialect.name, Attendance.checked_in_at)
+    removed_per_hour = select(func.count()).where(removed, Attendance.class_id == AttendanceRollup.class_id, hour == AttendanceRollup.hour).scalar_subquery()
+    await db.exec(update(AttendanceRollup).where(tuple_(AttendanceRollup.hour, AttendanceRollup.class_id).in_(select(hour, Attendance.class_id).where(removed))).values(check_ins=AttendanceRollup.check_ins - removed_per_hour))
+
+async def move_class(db: AsyncSession, class_id: int, trainer_id: int | None):
+    # A class's check-ins follow it to its new trainer, as the class-based reports do
+    await db.exec(update(AttendanceRollup).where(AttendanceRollup.class_id == class_id).values(trainer_id=trainer_id))
+
+async def reconcile(db: AsyncSession) -> list[dict]:
+    # Rebuilds every counter and rollup from Attendance and returns the classes whose stored total or rollup rows had drifted
+    # On Postgres, lock out concurrent check-ins/removals and other reconciles first. A writer that already
+    # changed Attendance then waits for the lock and applies its +1/-1 on top of the rebuilt counts.
+    if db.bind.dialect.name == "postgresql":
+        await db.exec(text("LOCK TABLE attendance_summary, attendance_rollup IN SHARE ROW EXCLUSIVE MODE"))
+    actual = dict((await db.exec(select(Attendance.class_id, func.count(Attendance.member_id)).group_by(Attendance.class_id))).all())
+    recorded = dict((await db.exec(select(AttendanceSummary.class_id, AttendanceSummary.attendance_total))).all())
+    # Rollup rows keyed by (hour, class_id); removals can leave a row at zero, which counts the same as no row
+    actual_hours = {(hour, class_id): (trainer_id, check_ins) for hour, class_id, trainer_id, check_ins in (await db.exec(rollup_rows(db.bind.dialect.name))).all()}
+    recorded_hours = {(hour, class_id): (trainer_id, check_ins) for hour, class_id, trainer_id, check_ins in (await db.exec(select(AttendanceRollup.hour, AttendanceRollup.class_id, AttendanceRollup.trainer_id, AttendanceRollup.check_ins))).all() if check_ins != 0}
+    rollup_drift = Counter(class_id for hour, class_id in actual_hours.keys() | recorded_hours.keys() if actual_hours.get((hour, class_id)) != recorded_hours.get((hour, class_id)))
+    drift = [{"class_id": class_id, "recorded_total": recorded.get(class_id, 0), "actual_total": actual.get(class_id, 0), "rollup_rows_drifted": rollup_drift[class_id]} for class_id in sorted(actual.keys() | recorded.keys() | rollup_drift.keys()) if recorded.get(class_id, 0) != actual.get(class_id, 0) or rollup_drift[class_id] > 0]
+
+    await db.exec(delete(AttendanceSummary))
+    await db.exec(insert(AttendanceSummary).from_select(["class_id", "attendance_total"], select(Attendance.class_id, func.count(Attendance.member_id)).group_by(Attendance.class_id)))
+    await db.exec(delete(AttendanceRollup))
+    await db.exec(insert(AttendanceRollup).from_select(["hour", "class_id", "trainer_id", "check_ins"], rollup_rows(db.bind.dialect.name)))
+    await db.commit()
+    return drift
+
+async def main():
+    async with AsyncSession(engine) as db:
+        drift = await reconcile(db)
+    for row in drift:
+        print(f"class {row['class_id']}: recorded {row['recorded_total']}, actual {row['actual_total']}, {row['rollup_rows_drifted']} rollup rows off")
+    print(f"Rebuilt attendance_summary and attendance_rollup, {len(drift)} classes had drifted")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
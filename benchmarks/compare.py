@@ -0,0 +1,44 @@
+"""Compare two benchmark suite results.
+
+Prints the change in throughput and p95 latency for every route both runs
+measured, and exits non-zero if any route got slower than the threshold
+allows, so it can gate a deploy:
+
+    python -m benchmarks.compare before.json after.json --threshold 0.2
+"""
+import argparse
+import json
+import sys
+
+
+def regressions(before: dict, after: dict, threshold: float) -> tuple[list[dict], list[str]]:
+    rows, regressed = [], []
+    for route in [route for route in after["routes"] if route in before["routes"]]:
+        old, new = before["routes"][route], after["routes"][route]
+        throughput = new["throughput_rps"] / old["throughput_rps"] - 1
+        p95 = new["p95_ms"] / old["p95_ms"] - 1 if old["p95_ms"] > 0 else 0.0
+        rows.append({"route": route, "throughput_change": round(throughput, 3), "p95_change": round(p95, 3), "queries_per_request": [old["queries_per_request"], new["queries_per_request"]]})
+        if throughput < -threshold or p95 > threshold or new["queries_per_request"] > old["queries_per_request"]:
+            regressed.append(route)
+    return rows, regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed fractional slowdown per route")
+    args = parser.parse_args()
+
+    with open(args.before) as before, open(args.after) as after:
+        before, after = json.load(before), json.load(after)
+    for key in ["database", "scale", "seed", "concurrency"]:
+        if before[key] != after[key]:
+            print(f"Warning: runs differ in {key} ({before[key]} vs {after[key]})", file=sys.stderr)
+    rows, regressed = regressions(before, after, args.threshold)
+    print(json.dumps({"before": before["commit"], "after": after["commit"], "routes": rows, "regressed": regressed}, indent=2))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
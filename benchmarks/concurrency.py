@@ -0,0 +1,65 @@
+"""Concurrent-request throughput benchmark.
+
+Seeds a throwaway database, then drives a handful of read routes in-process
+through an ASGI client at increasing concurrency and prints requests/second
+as JSON. Run it on two revisions to compare them:
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.concurrency
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench.db")
+
+import httpx
+
+from benchmarks.data import seed
+
+ROUTES = ["/members/1", "/trainers/1", "/classes/1", "/attendance/classes", "/members?limit=100"]
+
+
+async def measure(client: httpx.AsyncClient, route: str, concurrency: int, requests: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call():
+        async with semaphore:
+            response = await client.get(route)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+async def run(routes: list[str], concurrency_levels: list[int], requests: int) -> dict:
+    from main import app
+
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for route in routes:
+            await client.get(route)
+            results[route] = {str(level): round(await measure(client, route, level, requests), 1) for level in concurrency_levels}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--trainers", type=int, default=50)
+    parser.add_argument("--classes", type=int, default=500)
+    parser.add_argument("--per-class", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--routes", nargs="+", default=ROUTES)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    args = parser.parse_args()
+
+    seed(os.environ["DATABASE_URL"], args.members, args.trainers, args.classes, args.per_class)
+    results = asyncio.run(run(args.routes, args.concurrency, args.requests))
+    print(json.dumps({"database": os.environ["DATABASE_URL"].split("://")[0], "requests_per_second": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Synthetic gym data for the benchmarks.
+
+The same arguments always produce the same rows, so runs on different commits
+read identical data. Class c is attended by members c * per_class + 1 onwards
+(wrapping at members); the benchmarks rely on that to find pairs that are, or
+are not, checked in.
+"""
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlmodel import SQLModel
+
+from attendance_summary import rollup_rows
+from models import Member, Trainer, Class, Attendance, AttendanceRollup, AttendanceSummary
+
+SCALES = {
+    "small": {"members": 5_000, "trainers": 50, "classes": 500, "per_class": 20},
+    "medium": {"members": 20_000, "trainers": 200, "classes": 2_000, "per_class": 50},
+    "large": {"members": 100_000, "trainers": 500, "classes": 10_000, "per_class": 500},
+}
+SPECIALTIES = ["Strength", "Cardio", "Yoga", "Pilates", "Boxing", "Spin", "Mobility"]
+CHUNK_SIZE = 10_000
+
+
+def attendee(class_id: int, slot: int, members: int, per_class: int) -> int:
+    # Member in the given slot of a class; slots below per_class are checked in by seed()
+    return (class_id * per_class + slot) % members + 1
+
+
+def chunks(rows, size: int = CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def seed(url: str, members: int, trainers: int, classes: int, per_class: int, random_seed: int = 0) -> None:
+    rng = random.Random(random_seed)
+    start = datetime(2025, 1, 6, 6, 0)
+    engine = create_engine(url)
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for chunk in chunks({"id": i, "name": f"Trainer {i}", "specialty": rng.choice(SPECIALTIES)} for i in range(1, trainers + 1)):
+            connection.execute(insert(Trainer), chunk)
+        for chunk in chunks({"id": i, "name": f"Member {i}", "active": rng.random() < 0.7} for i in range(1, members + 1)):
+            connection.execute(insert(Member), chunk)
+        dates = {}
+        for chunk in chunks({"id": i, "name": f"Class {i}", "trainer_id": rng.randint(1, trainers), "date": start + timedelta(days=rng.randrange(365), hours=rng.randrange(14)), "duration": rng.choice([30, 45, 60, 90])} for i in range(1, classes + 1)):
+            connection.execute(insert(Class), chunk)
+            dates.update((row["id"], row["date"]) for row in chunk)
+        # Members check in over the quarter hour before their class starts
+        for chunk in chunks({"class_id": c, "member_id": attendee(c, slot, members, per_class), "checked_in_at": dates[c] - timedelta(minutes=slot % 15), "source": "seed"} for c in range(1, classes + 1) for slot in range(per_class)):
+            connection.execute(insert(Attendance), chunk)
+        connection.execute(insert(AttendanceSummary).from_select(["class_id", "attendance_total"], select(Attendance.class_id, func.count()).group_by(Attendance.class_id)))
+        connection.execute(insert(AttendanceRollup).from_select(["hour", "class_id", "trainer_id", "check_ins"], rollup_rows(engine.dialect.name)))
+        # Ids were given explicitly, so move Postgres' sequences past them for the app's own inserts
+        if engine.dialect.name == "postgresql":
+            for model in [Trainer, Member, Class]:
+                connection.execute(select(func.setval(func.pg_get_serial_sequence(model.__tablename__, "id"), func.max(model.id))))
+    # Plan with real statistics from the first request, not whenever autovacuum gets round to it
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    engine.dispose()
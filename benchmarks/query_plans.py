@@ -0,0 +1,131 @@
+"""Query-plan regression check.
+
+Seeds a throwaway database, calls each route below through an ASGI client and
+runs EXPLAIN on every SELECT/UPDATE/DELETE the route sends. Exits non-zero if
+any plan reads one of the large tables with a sequential scan, so a missing
+index shows up before it shows up in production:
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.query_plans
+    DATABASE_URL=postgresql://... python -m benchmarks.query_plans
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench.db")
+
+import httpx
+from sqlalchemy import create_engine, event, text, update
+
+from benchmarks.data import attendee, seed
+from models import Member
+
+LARGE_TABLES = {"member", "class", "attendance", "attendance_rollup"}
+
+def routes(members: int, per_class: int) -> list[tuple[str, str]]:
+    # Run in order against the same data, so the deletes come last
+    return [
+        ("GET", "/members/2"),
+        ("GET", "/members/2?expand=classes"),
+        ("GET", "/trainers/2"),
+        ("GET", "/trainers/2?expand=classes.members"),
+        ("GET", "/classes/2"),
+        ("GET", "/classes/2?expand=members"),
+        ("GET", "/members?after_id=1000&limit=50"),
+        ("GET", "/members?after_id=1000&limit=50&expand=classes"),
+        ("GET", "/trainers?after_id=10&limit=5&expand=classes.members"),
+        ("GET", "/classes?after_id=100&limit=50"),
+        ("GET", "/classes?after_id=100&limit=50&expand=members"),
+        ("GET", "/members?name=member%201234&limit=50"),
+        ("GET", "/members?active=true&limit=50"),
+        ("GET", "/members?class_id=7"),
+        ("GET", "/classes?name=class%20123&limit=50"),
+        ("GET", "/classes?trainer_id=3"),
+        ("GET", "/classes?start_date=2025-08-25T00:00:00&end_date=2025-08-26T00:00:00&limit=50"),
+        ("GET", "/attendance/classes/2"),
+        ("GET", "/attendance/trainers/2"),
+        ("GET", "/attendance/day_of_week?start_date=2025-08-25T00:00:00&end_date=2025-08-26T00:00:00"),
+        ("GET", "/attendance/active_members"),
+        ("GET", "/attendance/check_ins?start_date=2025-08-25T00:00:00&end_date=2025-09-01T00:00:00"),
+        ("GET", "/attendance/check_ins?interval=day&trainer_id=3"),
+        ("GET", "/attendance/hour_of_day?class_id=7"),
+        ("GET", "/export/members?since=2999-01-01T00:00:00"),
+        ("GET", "/export/attendance?since=2999-01-01T00:00:00"),
+        ("DELETE", f"/members/{attendee(3, 0, members, per_class)}/3"),
+        ("DELETE", f"/classes/4/{attendee(4, 0, members, per_class)}"),
+        ("DELETE", "/trainers/5"),
+    ]
+
+
+def sequential_scans(dialect: str, cursor, statement: str, parameters) -> list[str]:
+    # Tables the plan reads without an index
+    if dialect == "postgresql":
+        cursor.execute("EXPLAIN (FORMAT JSON) " + statement, parameters)
+        plan = cursor.fetchone()[0]
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        nodes, tables = [plan[0]["Plan"]], []
+        while nodes:
+            node = nodes.pop()
+            if node["Node Type"] == "Seq Scan":
+                tables.append(node["Relation Name"])
+            nodes.extend(node.get("Plans", []))
+        return tables
+    cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+    return [detail.split()[1] for *_, detail in cursor.fetchall() if detail.startswith("SCAN ") and " INDEX " not in detail]
+
+
+async def run(routes: list[tuple[str, str]]) -> dict:
+    from database import engine
+    from main import app
+
+    dialect = engine.dialect.name
+    current, failures = [None], {}
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            return
+        tables = LARGE_TABLES.intersection(sequential_scans(dialect, cursor, statement, parameters))
+        if tables:
+            failures.setdefault(current[0], []).append({"tables": sorted(tables), "statement": " ".join(statement.split())})
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for method, route in routes:
+            current[0] = f"{method} {route}"
+            response = await client.request(method, route)
+            response.raise_for_status()
+    event.remove(engine.sync_engine, "before_cursor_execute", explain)
+    return failures
+
+
+def prepare(url: str, active_percent: int) -> None:
+    # Most members of an established gym have lapsed; with seed()'s two-thirds active a full scan
+    # really is the best plan for active_members. Re-analyze so the planner knows
+    engine = create_engine(url)
+    with engine.begin() as connection:
+        connection.execute(update(Member).values(active=Member.id % 100 < active_percent))
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=20000)
+    parser.add_argument("--trainers", type=int, default=50)
+    parser.add_argument("--classes", type=int, default=2000)
+    parser.add_argument("--per-class", type=int, default=20)
+    parser.add_argument("--active-percent", type=int, default=10)
+    args = parser.parse_args()
+
+    seed(os.environ["DATABASE_URL"], args.members, args.trainers, args.classes, args.per_class)
+    prepare(os.environ["DATABASE_URL"], args.active_percent)
+    failures = asyncio.run(run(routes(args.members, args.per_class)))
+    print(json.dumps({"database": os.environ["DATABASE_URL"].split("://")[0], "sequential_scans": failures}, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""CPU cost of large list responses.
+
+Seeds a database with enough rows that each list route returns --rows items,
+then fetches every route --requests times in-process and prints the CPU time
+and wall time per request as JSON. Database time is part of both numbers, but
+on large pages most of the CPU goes on building and encoding the body:
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.serialization --rows 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench.db")
+
+import httpx
+
+from benchmarks.data import seed
+
+ROUTES = [
+    "/members", "/members?expand=classes", "/members?stream=true&expand=classes",
+    "/trainers", "/trainers?expand=classes.members",
+    "/classes", "/classes?expand=members", "/classes?stream=true&expand=members",
+]
+
+
+async def measure(client: httpx.AsyncClient, route: str, requests: int) -> dict:
+    cpu, wall, size = 0.0, 0.0, 0
+    for _ in range(requests):
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        response = await client.get(route)
+        cpu += time.process_time() - cpu_started
+        wall += time.perf_counter() - wall_started
+        response.raise_for_status()
+        size = len(response.content)
+    return {"cpu_ms_per_request": round(cpu / requests * 1000, 1), "wall_ms_per_request": round(wall / requests * 1000, 1), "items": len(response.json()), "bytes": size}
+
+
+async def run(routes: list[str], requests: int) -> dict:
+    from main import app
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None) as client:
+        for route in routes:
+            await client.get(route)
+        return {route: await measure(client, route, requests) for route in routes}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000, help="members and classes per response")
+    parser.add_argument("--trainers", type=int, default=200)
+    parser.add_argument("--per-class", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=5)
+    parser.add_argument("--routes", nargs="+", default=ROUTES)
+    args = parser.parse_args()
+
+    seed(os.environ["DATABASE_URL"], args.rows, args.trainers, args.rows, args.per_class)
+    results = asyncio.run(run(args.routes, args.requests))
+    print(json.dumps({"database": os.environ["DATABASE_URL"].split("://")[0], "rows": args.rows, "cpu_per_request": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Per-route benchmark suite.
+
+Seeds a synthetic gym (see benchmarks.data), then drives every route in main.py
+in-process through an ASGI client and prints, per route, throughput,
+p50/p95/p99 latency, queries per request and peak RSS as JSON. Reads run
+first, then writes, then deletes, each against rows the earlier steps left
+alone, so the same scale and seed give the same workload on every commit:
+
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.suite --scale small > before.json
+    DATABASE_URL=postgresql://localhost/bench python -m benchmarks.suite --scale large > after.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench.db")
+
+import httpx
+
+from benchmarks.data import SCALES, attendee, seed
+
+
+class Case:
+    # One route: request(i, state) builds the i-th request; setup(client, count) may create rows for it first
+    def __init__(self, method: str, path: str, request, setup=None):
+        self.method = method
+        self.path = path
+        self.request = request
+        self.setup = setup
+
+
+def cases(members: int, trainers: int, classes: int, per_class: int) -> list[Case]:
+    def member(i): return i % members + 1
+    def trainer(i): return i % trainers + 1
+    def course(i): return i % classes + 1
+    # Pairs checked in by the seed, and pairs in the slots after them that are not. Each route takes
+    # every other slot (its lane) so two routes never touch the same pair
+    def seeded_pair(i, lane): return course(i), attendee(course(i), lane + 2 * (i // classes), members, per_class)
+    def free_pair(i, lane): return course(i), attendee(course(i), per_class + lane + 2 * (i // classes), members, per_class)
+    date = "2025-06-02T18:00:00"
+
+    async def create(client, path, rows):
+        response = await client.post(path, json=rows)
+        response.raise_for_status()
+        return response.json()
+
+    async def finished_job(client, count):
+        # The ASGI transport skips the app's lifespan, so the report workers are started here
+        from jobs import report_jobs
+        if report_jobs.queue == None:
+            await report_jobs.start()
+        job = (await client.get("/attendance/trainers?background=true")).json()
+        await client.get(f"/jobs/{job['id']}?wait=30")
+        return job["id"]
+
+    return [
+        # Reads
+        Case("GET", "/members", lambda i, _: (f"/members?after_id={member(i * 97)}&limit=100", None)),
+        Case("GET", "/trainers", lambda i, _: (f"/trainers?after_id={trainer(i)}&limit=20", None)),
+        Case("GET", "/classes", lambda i, _: (f"/classes?after_id={course(i * 97)}&limit=100", None)),
+        Case("POST", "/members/lookup", lambda i, _: ("/members/lookup", {"ids": [member(i * 100 + n * 7) for n in range(100)]})),
+        Case("POST", "/trainers/lookup", lambda i, _: ("/trainers/lookup", {"ids": [trainer(i + n) for n in range(20)]})),
+        Case("POST", "/classes/lookup", lambda i, _: ("/classes/lookup?expand=members", {"ids": [course(i * 100 + n * 7) for n in range(100)]})),
+        Case("GET", "/members/{member_id}", lambda i, _: (f"/members/{member(i)}", None)),
+        Case("GET", "/trainers/{trainer_id}", lambda i, _: (f"/trainers/{trainer(i)}", None)),
+        Case("GET", "/classes/{class_id}", lambda i, _: (f"/classes/{course(i)}", None)),
+        Case("GET", "/attendance/classes", lambda i, _: ("/attendance/classes", None)),
+        Case("GET", "/attendance/classes/{class_id}", lambda i, _: (f"/attendance/classes/{course(i)}", None)),
+        Case("GET", "/attendance/trainers", lambda i, _: ("/attendance/trainers?limit=50", None)),
+        Case("GET", "/attendance/trainers/{trainer_id}", lambda i, _: (f"/attendance/trainers/{trainer(i)}", None)),
+        Case("GET", "/attendance/day_of_week", lambda i, _: ("/attendance/day_of_week?start_date=2025-03-01T00:00:00&end_date=2025-06-01T00:00:00", None)),
+        Case("GET", "/attendance/active_members", lambda i, _: ("/attendance/active_members", None)),
+        Case("GET", "/jobs/{job_id}", lambda i, job_id: (f"/jobs/{job_id}", None), finished_job),
+        Case("GET", "/attendance/check_ins", lambda i, _: (f"/attendance/check_ins?interval=day&trainer_id={trainer(i)}", None)),
+        Case("GET", "/attendance/hour_of_day", lambda i, _: ("/attendance/hour_of_day?start_date=2025-03-01T00:00:00&end_date=2025-06-01T00:00:00", None)),
+        Case("GET", "/export/{entity}", lambda i, _: ("/export/classes?format=ndjson", None)),
+        Case("GET", "/metrics", lambda i, _: ("/metrics", None)),
+        Case("GET", "/metrics/pool", lambda i, _: ("/metrics/pool", None)),
+        Case("GET", "/metrics/cache", lambda i, _: ("/metrics/cache", None)),
+        # Writes
+        Case("POST", "/members", lambda i, _: ("/members", {"name": f"Bench member {i}", "active": True})),
+        Case("POST", "/trainers", lambda i, _: ("/trainers", {"name": f"Bench trainer {i}", "specialty": "Spin"})),
+        Case("POST", "/classes", lambda i, _: ("/classes", {"name": f"Bench class {i}", "trainer_id": trainer(i), "date": date, "duration": 45})),
+        Case("POST", "/members/bulk", lambda i, _: ("/members/bulk", [{"name": f"Bench member {i}.{n}", "active": True} for n in range(100)])),
+        Case("POST", "/trainers/bulk", lambda i, _: ("/trainers/bulk", [{"name": f"Bench trainer {i}.{n}", "specialty": "Spin"} for n in range(100)])),
+        Case("POST", "/classes/bulk", lambda i, _: ("/classes/bulk", [{"name": f"Bench class {i}.{n}", "trainer_id": trainer(i + n), "date": date, "duration": 45} for n in range(100)])),
+        Case("POST", "/attendance/{class_id}/{member_id}", lambda i, _: ("/attendance/{}/{}".format(*free_pair(i, 0)), None)),
+        Case("POST", "/attendance/batch", lambda i, _: ("/attendance/batch", [dict(zip(["class_id", "member_id"], free_pair(i * 20 + n, 1))) for n in range(20)])),
+        Case("PATCH", "/members/{member_id}", lambda i, _: (f"/members/{member(i)}", {"name": f"Renamed member {i}"})),
+        Case("PATCH", "/trainers/{trainer_id}", lambda i, _: (f"/trainers/{trainer(i)}", {"specialty": "Boxing"})),
+        Case("PATCH", "/classes/{class_id}", lambda i, _: (f"/classes/{course(i)}", {"duration": 60})),
+        Case("POST", "/attendance/reconcile", lambda i, _: ("/attendance/reconcile", None)),
+        # Deletes: attendance from the seeded slots, and rows the setup creates for the purpose
+        Case("DELETE", "/classes/{class_id}/{member_id}", lambda i, _: ("/classes/{}/{}".format(*seeded_pair(i, 0)), None)),
+        Case("DELETE", "/members/{member_id}/{class_id}", lambda i, _: ("/members/{1}/{0}".format(*seeded_pair(i, 1)), None)),
+        Case("DELETE", "/members/{member_id}", lambda i, ids: (f"/members/{ids[i]}", None), lambda client, count: create(client, "/members/bulk", [{"name": f"Doomed member {n}", "active": False} for n in range(count)])),
+        Case("DELETE", "/classes/{class_id}", lambda i, ids: (f"/classes/{ids[i]}", None), lambda client, count: create(client, "/classes/bulk", [{"name": f"Doomed class {n}", "trainer_id": trainer(n), "date": date, "duration": 45} for n in range(count)])),
+        Case("DELETE", "/trainers/{trainer_id}", lambda i, ids: (f"/trainers/{ids[i]}", None), lambda client, count: create(client, "/trainers/bulk", [{"name": f"Doomed trainer {n}", "specialty": "Spin"} for n in range(count)])),
+        # Bulk deletes by name prefix, one setup row per request
+        Case("DELETE", "/members", lambda i, _: (f"/members?name=Swept member {i:06d}", None), lambda client, count: create(client, "/members/bulk", [{"name": f"Swept member {n:06d}", "active": False} for n in range(count)])),
+        Case("DELETE", "/classes", lambda i, _: (f"/classes?name=Swept class {i:06d}", None), lambda client, count: create(client, "/classes/bulk", [{"name": f"Swept class {n:06d}", "trainer_id": trainer(n), "date": date, "duration": 45} for n in range(count)])),
+    ]
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def reset_peak_rss() -> None:
+    # Linux lets a process reset its own high-water mark; elsewhere the peak is since process start
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as process_status:
+            return next(int(line.split()[1]) for line in process_status if line.startswith("VmHWM:")) / 1024
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def measure(client: httpx.AsyncClient, case: Case, concurrency: int, requests: int) -> dict:
+    from database import pool_stats
+
+    state = await case.setup(client, requests) if case.setup != None else None
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def call(i: int):
+        nonlocal errors
+        url, body = case.request(i, state)
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(case.method, url, json=body)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+
+    reset_peak_rss()
+    queries = pool_stats.queries
+    started = time.perf_counter()
+    await asyncio.gather(*(call(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "queries_per_request": round((pool_stats.queries - queries) / requests, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def run(case_list: list[Case], concurrency: int, requests: int, only: list[str] | None) -> tuple[dict, list[str]]:
+    from fastapi.routing import APIRoute
+    from main import app
+
+    covered = {f"{case.method} {case.path}" for case in case_list}
+    unbenchmarked = sorted(f"{method} {route.path}" for route in app.routes if isinstance(route, APIRoute) for method in route.methods if f"{method} {route.path}" not in covered)
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for case in case_list:
+            name = f"{case.method} {case.path}"
+            if only == None or name in only:
+                results[name] = await measure(client, case, concurrency, requests)
+    return results, unbenchmarked
+
+
+def commit() -> str | None:
+    repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=repository, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=repository, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return revision + ("-dirty" if dirty else "")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--members", type=int)
+    parser.add_argument("--trainers", type=int)
+    parser.add_argument("--classes", type=int)
+    parser.add_argument("--per-class", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--routes", nargs="+", help='only these routes, e.g. "GET /members"')
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the database from the previous run")
+    args = parser.parse_args()
+
+    scale = {key: getattr(args, key) if getattr(args, key) != None else value for key, value in SCALES[args.scale].items()}
+    if not args.skip_seed:
+        seed(os.environ["DATABASE_URL"], **scale, random_seed=args.seed)
+    results, unbenchmarked = asyncio.run(run(cases(**scale), args.concurrency, args.requests, args.routes))
+    print(json.dumps({
+        "commit": commit(),
+        "database": os.environ["DATABASE_URL"].split("://")[0],
+        "scale": scale,
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "routes": results,
+        "unbenchmarked": unbenchmarked,
+    }, indent=2))
+    if unbenchmarked:
+        print(f"No benchmark case for: {', '.join(unbenchmarked)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import time
+from collections import OrderedDict
+
+from decouple import config
+
+CACHE_MAX_ENTRIES = config("CACHE_MAX_ENTRIES", default=10000, cast=int)
+CACHE_TTL_SECONDS = config("CACHE_TTL_SECONDS", default=30, cast=float)
+# How long invalidations are remembered for refusing stale fills; a fill from a read older than that is refused
+CACHE_INVALIDATION_WINDOW = config("CACHE_INVALIDATION_WINDOW", default=60, cast=float)
+
+# Dependencies are (entity, id) pairs such as ("member", 1); keys start with one, followed by anything
+# else that picks the representation (see documents.Shape). Values are (body, etag)
+class ResponseCache:
+    # Bounded LRU of serialized responses with a TTL. Every entry lists the entities its payload embeds,
+    # so invalidating one entity drops exactly the responses that contain it (e.g. a trainer rename
+    # drops the trainer and every class that shows the trainer's name).
+    #
+    # A fill says when the data it read is from (read_at, on the time.monotonic() clock): a read that began
+    # before a write committed, or that came from a replica behind it, must not put the old payload back
+    # after the write's invalidation. Invalidations are remembered for invalidation_window seconds to check.
+    def __init__(self, max_entries: int, ttl_seconds: float, invalidation_window: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.invalidation_window = invalidation_window
+        self.entries: OrderedDict[tuple, tuple[float, tuple[bytes, str], set]] = OrderedDict()
+        self.dependents: dict[tuple, set] = {}
+        # entity -> when it was last invalidated, oldest first; anything older than forgotten_before is gone
+        self.invalidated_at: OrderedDict[tuple, float] = OrderedDict()
+        self.forgotten_before = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+
+    def get(self, key: tuple) -> tuple[bytes, str] | None:
+        entry = self.entries.get(key)
+        if entry == None:
+            self.misses += 1
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self.expirations += 1
+            self.misses += 1
+            self.remove(key)
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: tuple, value: tuple[bytes, str], dependencies: list[tuple], read_at: float | None = None):
+        dependencies = {key, *dependencies}
+        if read_at != None and (read_at <= self.forgotten_before or any(self.invalidated_at.get(dependency, float("-inf")) >= read_at for dependency in dependencies)):
+            self.stale_fills += 1
+            return
+        self.remove(key)
+        self.entries[key] = (time.monotonic() + self.ttl_seconds, value, dependencies)
+        for dependency in dependencies:
+            self.dependents.setdefault(dependency, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self.evictions += 1
+            self.remove(next(iter(self.entries)))
+
+    def remove(self, key: tuple):
+        entry = self.entries.pop(key, None)
+        if entry == None:
+            return
+        for dependency in entry[2]:
+            keys = self.dependents.get(dependency)
+            if keys != None:
+                keys.discard(key)
+                if len(keys) == 0:
+                    del self.dependents[dependency]
+
+    def invalidate(self, *entities: tuple):
+        now = time.monotonic()
+        for entity in entities:
+            self.invalidated_at[entity] = now
+            self.invalidated_at.move_to_end(entity)
+            for key in list(self.dependents.get(entity, ())):
+                self.invalidations += 1
+                self.remove(key)
+        while len(self.invalidated_at) > 0 and next(iter(self.invalidated_at.values())) < now - self.invalidation_window:
+            self.forgotten_before = self.invalidated_at.popitem(last=False)[1]
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_fills": self.stale_fills,
+        }
+
+response_cache = ResponseCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS, CACHE_INVALIDATION_WINDOW)
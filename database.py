@@ -1,9 +1,174 @@
+import time
+
 from decouple import config
-from sqlmodel import Session, create_engine
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from instrumentation import record_query
 
 DATABASE_URL = config("DATABASE_URL")
+# Optional read replica for the GET routes and reports; unset, everything reads from DATABASE_URL
+REPLICA_DATABASE_URL = config("REPLICA_DATABASE_URL", default="")
+# After a write a client reads from the primary for this long, so it sees its own writes; it should
+# cover the replica's usual lag, which the response cache also allows for (cache.py)
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=5, cast=float)
+
+# Pool sizing; each uvicorn worker gets its own pool, so workers * (size + overflow) must fit under max_connections
+DB_POOL_SIZE = config("DB_POOL_SIZE", default=5, cast=int)
+DB_MAX_OVERFLOW = config("DB_MAX_OVERFLOW", default=10, cast=int)
+DB_POOL_TIMEOUT = config("DB_POOL_TIMEOUT", default=30, cast=float)
+DB_POOL_RECYCLE = config("DB_POOL_RECYCLE", default=1800, cast=int)
+DB_POOL_PRE_PING = config("DB_POOL_PRE_PING", default=True, cast=bool)
+
+# DATABASE_URL stays a plain sync URL (Alembic uses it as-is); the app swaps in the matching async driver
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+def async_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+
+class PoolStats:
+    # Cumulative counters since process start; gauges are read live from the pool
+    def __init__(self):
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.queries = 0
+        self.query_seconds_total = 0.0
+
+    def record_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+pool_stats = PoolStats()
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Times how long each checkout waits for a free connection (including opening a new one)
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_stats.record_wait(time.perf_counter() - start)
+
+def create_engine(url: str):
+    return create_async_engine(
+        async_url(url),
+        poolclass=TimedQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
 engine = create_engine(DATABASE_URL)
+replica_engine = create_engine(REPLICA_DATABASE_URL) if REPLICA_DATABASE_URL != "" else engine
+engines = list(dict.fromkeys([engine, replica_engine]))
+
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+def start_query_timer(connection, cursor, statement, parameters, context, executemany):
+    context.query_started_at = time.perf_counter()
+
+def stop_query_timer(connection, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context.query_started_at
+    pool_stats.queries += 1
+    pool_stats.query_seconds_total += seconds
+    # The async adapters buffer a SELECT's rows on execute (server-side cursors excepted), so the buffer
+    # holds what was fetched; for writes rowcount is the rows affected
+    rows = len(cursor._rows) if cursor.description != None and hasattr(cursor, "_rows") else max(cursor.rowcount, 0)
+    record_query(statement, seconds, rows)
+
+for each_engine in engines:
+    # SQLite leaves foreign keys unenforced unless asked, and check-in relies on them to reject unknown ids
+    if each_engine.dialect.name == "sqlite":
+        event.listen(each_engine.sync_engine, "connect", enable_sqlite_foreign_keys)
+    event.listen(each_engine.sync_engine, "before_cursor_execute", start_query_timer)
+    event.listen(each_engine.sync_engine, "after_cursor_execute", stop_query_timer)
+
+def pool_metrics() -> dict:
+    pool = engine.sync_engine.pool
+    return {
+        "pool_size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checkouts_total": pool_stats.checkouts,
+        "checkout_wait_seconds_total": pool_stats.wait_seconds_total,
+        "checkout_wait_seconds_max": pool_stats.wait_seconds_max,
+        "queries_total": pool_stats.queries,
+        "query_seconds_total": pool_stats.query_seconds_total,
+    }
+
+async def warm_pool():
+    # Open pool_size connections up front so the first requests after a deploy don't pay for connecting
+    for each_engine in engines:
+        connections = [await each_engine.connect() for _ in range(DB_POOL_SIZE)]
+        for connection in connections:
+            await connection.close()
+
+async def dispose_engines():
+    for each_engine in engines:
+        await each_engine.dispose()
+
+def upsert(db: AsyncSession, model):
+    # Dialect-specific INSERT so ON CONFLICT clauses can be used on both Postgres and SQLite
+    dialect_insert = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}[db.bind.dialect.name]
+    return dialect_insert(model)
+
+async def get_db(request: Request):
+    # Writes, and reads that must see them
+    request.state.used_primary = True
+    async with AsyncSession(engine) as session:
+        yield session
+
+# READ REPLICA
+# Read-your-writes: a successful write (a non-GET request that used get_db) answers with a cookie holding
+# the time until which that client's reads stay on the primary
+PRIMARY_COOKIE = "read_primary_until"
+
+def read_engine(request: Request):
+    try:
+        read_primary_until = float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        read_primary_until = 0
+    return engine if read_primary_until > time.time() else replica_engine
+
+async def get_read_db(request: Request):
+    # GET routes and reports: the replica, unless the client wrote recently
+    async with AsyncSession(read_engine(request)) as session:
+        yield session
+
+def read_time(db: AsyncSession) -> float:
+    # When the data a session reads could be from, for the response cache; the replica may be behind by
+    # up to REPLICA_STICKY_SECONDS
+    return time.monotonic() - (REPLICA_STICKY_SECONDS if db.bind is not engine else 0)
+
+class ReadYourWritesMiddleware:
+    # Sets the cookie on successful writes; nothing to do without a replica
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or replica_engine is engine or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            return await self.app(scope, receive, send)
+        state = scope.setdefault("state", {})
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400 and state.get("used_primary"):
+                cookie = f"{PRIMARY_COOKIE}={time.time() + REPLICA_STICKY_SECONDS:.3f}; Max-Age={int(REPLICA_STICKY_SECONDS) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
 
-def get_db():
-    with Session(engine) as session:
-        yield session       
+        await self.app(scope, receive, send_with_cookie)
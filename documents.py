@@ -0,0 +1,301 @@
+from collections import defaultdict
+
+import orjson
+from fastapi import HTTPException, status
+from sqlalchemy import Text, case, cast, func, literal_column, true
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.orm import joinedload, load_only, selectinload
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import versions
+from models import Attendance, Class, Member, Trainer
+
+# Response documents for the read endpoints, as ready-to-send JSON bytes. On Postgres the whole nested
+# document is built by the database with json_build_object/json_agg and passed through untouched; other
+# databases fall back to plain row tuples assembled into dicts and encoded with orjson. Field order
+# matches the schemas.py models either way, and only the fields and relationships a Shape asks for are
+# read at all.
+
+# SHAPES
+# Every field of a document in schemas.py order, and the relationships ?expand= can add. Relationships
+# are left out unless expanded, so by default a read only touches the entity's own row.
+DOCUMENTS = {
+    "member": (["id", "name", "classes", "active"], {"classes"}),
+    "trainer": (["id", "name", "specialty", "classes"], {"classes", "classes.members"}),
+    "class": (["id", "name", "trainer_id", "trainer", "date", "members", "duration"], {"members"}),
+}
+
+class Shape:
+    # fields are the keys to return, in document order; expand the relationships to load for them
+    def __init__(self, fields: list[str], expand: frozenset[str]):
+        self.fields = fields
+        self.expand = expand
+
+    def pick(self, values: dict) -> dict:
+        return {field: values[field] for field in self.fields}
+
+    def key(self) -> tuple:
+        # Each shape is a different body, so it's part of the response cache key
+        return (tuple(self.fields), tuple(sorted(self.expand)))
+
+def split(parameter: str | None) -> list[str]:
+    return [part.strip() for part in parameter.split(",") if part.strip() != ""] if parameter != None else []
+
+def shape_for(entity: str, fields: str | None = None, expand: str | None = None) -> Shape:
+    # Parses ?fields=name,active&expand=classes. id is always returned, since it's what after_id pages on
+    all_fields, expansions = DOCUMENTS[entity]
+    expanded = set(split(expand))
+    unknown = sorted(expanded - expansions)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Cannot expand {', '.join(unknown)} on {entity}; expandable: {', '.join(sorted(expansions))}")
+    # Expanding classes.members expands classes too
+    expanded |= {expansion.split(".")[0] for expansion in expanded}
+    plain = [field for field in all_fields if field not in expansions]
+    requested = set(split(fields)) if fields != None else set(plain)
+    unknown = sorted(requested - set(plain))
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unknown fields {', '.join(unknown)} on {entity}; relationships are added with expand")
+    return Shape([field for field in all_fields if field == "id" or field in requested or field in expanded], frozenset(expanded))
+
+def nested_class_shape(shape: Shape) -> Shape:
+    # Classes embedded in a trainer are whole class documents; ?expand=classes.members adds their members
+    return shape_for("class", expand="members" if "classes.members" in shape.expand else None)
+
+# FROM ORM OBJECTS (by-id routes and streaming)
+def columns(model, shape: Shape, *extra):
+    # Only the columns the shape returns, plus version for the ETag
+    return load_only(*[getattr(model, field) for field in shape.fields if field in model.__table__.c], model.version, *extra)
+
+def member_options(shape: Shape) -> list:
+    return [columns(Member, shape)] + ([selectinload(Member.classes)] if "classes" in shape.expand else [])
+
+def trainer_options(shape: Shape) -> list:
+    if "classes.members" in shape.expand:
+        return [columns(Trainer, shape, Trainer.name), selectinload(Trainer.classes).selectinload(Class.members)]
+    if "classes" in shape.expand:
+        return [columns(Trainer, shape, Trainer.name), selectinload(Trainer.classes)]
+    return [columns(Trainer, shape)]
+
+def class_options(shape: Shape) -> list:
+    # The trainer is always joined: its version is part of every class ETag
+    return [columns(Class, shape, Class.trainer_id), joinedload(Class.trainer)] + ([selectinload(Class.members)] if "members" in shape.expand else [])
+
+# Only the shape's fields are read: the rest weren't loaded, and touching them would lazy-load
+def build_member_response(member: Member, shape: Shape) -> dict:
+    return {field: [{"name": course.name, "trainer_id": course.trainer_id, "date": course.date, "duration": course.duration} for course in member.classes] if field == "classes" else getattr(member, field) for field in shape.fields}
+
+def class_values(course: Class, trainer: str, shape: Shape) -> dict:
+    return {field: trainer if field == "trainer" else [member.name for member in course.members] if field == "members" else getattr(course, field) for field in shape.fields}
+
+def build_trainer_response(trainer: Trainer, shape: Shape) -> dict:
+    nested = nested_class_shape(shape)
+    return {field: [class_values(course, trainer.name, nested) for course in trainer.classes] if field == "classes" else getattr(trainer, field) for field in shape.fields}
+
+def build_class_response(course: Class, shape: Shape) -> dict:
+    # A class outlives its trainer, with trainer_id and trainer left null
+    return class_values(course, course.trainer.name if course.trainer != None else None, shape)
+
+# POSTGRES
+EMPTY_JSON_ARRAY = literal_column("'[]'::json")
+
+def json_object(**fields):
+    # Keys are fixed field names, so they go into the SQL as literals rather than untyped bind parameters
+    return func.json_build_object(*[part for key, value in fields.items() for part in (literal_column(f"'{key}'"), value)])
+
+def json_array(value, order_by=None):
+    return func.coalesce(func.json_agg(aggregate_order_by(value, order_by) if order_by is not None else value), EMPTY_JSON_ARRAY)
+
+def as_text(document):
+    # Read back as text so the driver hands over the JSON as-is instead of decoding it
+    return cast(document, Text)
+
+def member_names(class_id):
+    return select(json_array(Member.name)).select_from(Attendance).join(Member, Member.id == Attendance.member_id).where(Attendance.class_id == class_id).scalar_subquery()
+
+def trainer_name(trainer_id):
+    return select(Trainer.name).where(Trainer.id == trainer_id).scalar_subquery()
+
+# member, trainer and course are either the model or a page subquery's columns
+def postgres_member(member, shape: Shape):
+    values = {"id": member.id, "name": member.name, "active": member.active}
+    if "classes" in shape.expand:
+        values["classes"] = select(json_array(json_object(name=Class.name, trainer_id=Class.trainer_id, date=Class.date, duration=Class.duration))).select_from(Attendance).join(Class, Class.id == Attendance.class_id).where(Attendance.member_id == member.id).scalar_subquery()
+    return json_object(**shape.pick(values))
+
+def postgres_class(course, trainer, shape: Shape):
+    values = {"id": course.id, "name": course.name, "trainer_id": course.trainer_id, "trainer": trainer, "date": course.date, "duration": course.duration}
+    if "members" in shape.expand:
+        values["members"] = member_names(course.id)
+    return json_object(**shape.pick(values))
+
+def postgres_trainer(trainer, shape: Shape):
+    values = {"id": trainer.id, "name": trainer.name, "specialty": trainer.specialty}
+    if "classes" in shape.expand:
+        values["classes"] = select(json_array(postgres_class(Class, trainer.name, nested_class_shape(shape)))).where(Class.trainer_id == trainer.id).scalar_subquery()
+    return json_object(**shape.pick(values))
+
+def embedded(model, statement, name: str):
+    # Version sum and ids of the rows a by-id document embeds, for its ETag and cache dependencies
+    return statement.add_columns(func.coalesce(func.sum(model.version), 0).label("versions"), func.array_agg(model.id).label("ids")).lateral(name)
+
+async def postgres_document(db: AsyncSession, statement, tag: str, entity_id: int, relationships: list[tuple[str, object]]) -> tuple[bytes, str, list[tuple]] | None:
+    # statement selects the document and the row's own version; each (entity, lateral) relationship adds its
+    # version sum to the ETag and its ids to the cache dependencies, all in the same round trip
+    for _, rows in relationships:
+        statement = statement.outerjoin(rows, true()).add_columns(rows.c.versions, rows.c.ids)
+    row = (await db.exec(statement)).first()
+    if row == None:
+        return None
+    body, own_version, *related = row
+    dependencies = [(entity, id) for (entity, _), ids in zip(relationships, related[1::2]) for id in ids or []]
+    return body.encode(), versions.etag(tag, entity_id, own_version, *related[0::2]), dependencies
+
+async def postgres_member_document(db: AsyncSession, member_id: int, shape: Shape) -> tuple[bytes, str, list[tuple]] | None:
+    statement = select(as_text(postgres_member(Member, shape)), Member.version).select_from(Member).where(Member.id == member_id)
+    relationships = []
+    if "classes" in shape.expand:
+        relationships.append(("class", embedded(Class, select().select_from(Attendance).join(Class, Class.id == Attendance.class_id).where(Attendance.member_id == Member.id), "classes")))
+    return await postgres_document(db, statement, "m", member_id, relationships)
+
+async def postgres_trainer_document(db: AsyncSession, trainer_id: int, shape: Shape) -> tuple[bytes, str, list[tuple]] | None:
+    statement = select(as_text(postgres_trainer(Trainer, shape)), Trainer.version).select_from(Trainer).where(Trainer.id == trainer_id)
+    relationships = []
+    if "classes" in shape.expand:
+        relationships.append(("class", embedded(Class, select().where(Class.trainer_id == Trainer.id), "classes")))
+    if "classes.members" in shape.expand:
+        relationships.append(("member", embedded(Member, select().select_from(Attendance).join(Member, Member.id == Attendance.member_id).join(Class, Class.id == Attendance.class_id).where(Class.trainer_id == Trainer.id), "members")))
+    return await postgres_document(db, statement, "t", trainer_id, relationships)
+
+async def postgres_class_document(db: AsyncSession, class_id: int, shape: Shape) -> tuple[bytes, str, list[tuple]] | None:
+    statement = select(as_text(postgres_class(Class, trainer_name(Class.trainer_id), shape)), Class.version).select_from(Class).where(Class.id == class_id)
+    # Every class shows its trainer's name, so the trainer is always embedded
+    relationships = [("trainer", embedded(Trainer, select().where(Trainer.id == Class.trainer_id), "trainer"))]
+    if "members" in shape.expand:
+        relationships.append(("member", embedded(Member, select().select_from(Attendance).join(Member, Member.id == Attendance.member_id).where(Attendance.class_id == Class.id), "members")))
+    return await postgres_document(db, statement, "c", class_id, relationships)
+
+# GENERIC FALLBACK
+# Pages read as plain row tuples rather than ORM objects: no identity map, no relationship loading.
+# Child rows are fetched with the page as a subquery, so an unlimited page doesn't become a huge IN list.
+def page_columns(page, shape: Shape, *extra: str) -> list:
+    return [page.c[field] for field in shape.fields if field in page.c] + [page.c[field] for field in extra if field not in shape.fields]
+
+async def member_page(db: AsyncSession, page, shape: Shape) -> list[dict]:
+    classes = defaultdict(list)
+    if "classes" in shape.expand:
+        for member_id, name, trainer_id, date, duration in (await db.exec(select(Attendance.member_id, Class.name, Class.trainer_id, Class.date, Class.duration).join(Class, Class.id == Attendance.class_id).where(Attendance.member_id.in_(select(page.c.id))))).all():
+            classes[member_id].append({"name": name, "trainer_id": trainer_id, "date": date, "duration": duration})
+    return [shape.pick({**row._asdict(), "classes": classes[row.id]}) for row in (await db.exec(select(*page_columns(page, shape)).order_by(page.c.id))).all()]
+
+async def trainer_page(db: AsyncSession, page, shape: Shape) -> list[dict]:
+    if "classes" not in shape.expand:
+        return [shape.pick(row._asdict()) for row in (await db.exec(select(*page_columns(page, shape)).order_by(page.c.id))).all()]
+    nested = nested_class_shape(shape)
+    members = defaultdict(list)
+    if "members" in nested.expand:
+        for class_id, name in (await db.exec(select(Attendance.class_id, Member.name).join(Member, Member.id == Attendance.member_id).join(Class, Class.id == Attendance.class_id).where(Class.trainer_id.in_(select(page.c.id))))).all():
+            members[class_id].append(name)
+    # The trainer's name is read even when not returned: every embedded class shows it
+    trainers = [{**row._asdict(), "classes": []} for row in (await db.exec(select(*page_columns(page, shape, "name")).order_by(page.c.id))).all()]
+    by_id = {trainer["id"]: trainer for trainer in trainers}
+    for id, name, trainer_id, date, duration in (await db.exec(select(Class.id, Class.name, Class.trainer_id, Class.date, Class.duration).where(Class.trainer_id.in_(select(page.c.id))))).all():
+        by_id[trainer_id]["classes"].append(nested.pick({"id": id, "name": name, "trainer_id": trainer_id, "trainer": by_id[trainer_id]["name"], "date": date, "members": members[id], "duration": duration}))
+    return [shape.pick(trainer) for trainer in trainers]
+
+async def class_page(db: AsyncSession, page, shape: Shape) -> list[dict]:
+    members = defaultdict(list)
+    if "members" in shape.expand:
+        for class_id, name in (await db.exec(select(Attendance.class_id, Member.name).join(Member, Member.id == Attendance.member_id).where(Attendance.class_id.in_(select(page.c.id))))).all():
+            members[class_id].append(name)
+    statement = select(*page_columns(page, shape)).order_by(page.c.id)
+    if "trainer" in shape.fields:
+        statement = statement.add_columns(Trainer.name.label("trainer")).outerjoin(Trainer, Trainer.id == page.c.trainer_id)
+    return [shape.pick({**row._asdict(), "members": members[row.id]}) for row in (await db.exec(statement)).all()]
+
+async def generic_member_document(db: AsyncSession, member_id: int, shape: Shape) -> tuple[bytes, str, list[tuple]] | None:
+    member: Member | None = await db.get(Member, member_id, options=member_options(shape))
+    if member == None:
+        return None
+    return orjson.dumps(build_member_response(member, shape)), versions.member_etag(member, shape.expand), [("class", course.id) for course in member.classes] if "classes" in shape.expand else []
+
+async def generic_trainer_document(db: AsyncSession, trainer_id: int, shape: Shape) -> tuple[bytes, str, list[tuple]] | None:
+    trainer: Trainer | None = await db.get(Trainer, trainer_id, options=trainer_options(shape))
+    if trainer == None:
+        return None
+    dependencies = [("class", course.id) for course in trainer.classes] if "classes" in shape.expand else []
+    if "classes.members" in shape.expand:
+        dependencies += [("member", member.id) for course in trainer.classes for member in course.members]
+    return orjson.dumps(build_trainer_response(trainer, shape)), versions.trainer_etag(trainer, shape.expand), dependencies
+
+async def generic_class_document(db: AsyncSession, class_id: int, shape: Shape) -> tuple[bytes, str, list[tuple]] | None:
+    course: Class | None = await db.get(Class, class_id, options=class_options(shape))
+    if course == None:
+        return None
+    return orjson.dumps(build_class_response(course, shape)), versions.class_etag(course, shape.expand), [("trainer", course.trainer_id)] + ([("member", member.id) for member in course.members] if "members" in shape.expand else [])
+
+# ENTRY POINTS
+# statement is a paginated select of the entity; the result is the JSON array for that page
+def uses_json_aggregation(db: AsyncSession) -> bool:
+    return db.bind.dialect.name == "postgresql"
+
+async def member_list(db: AsyncSession, statement, shape: Shape) -> bytes:
+    page = statement.subquery()
+    if uses_json_aggregation(db):
+        return (await db.exec(select(as_text(json_array(postgres_member(page.c, shape), page.c.id))).select_from(page))).one().encode()
+    return orjson.dumps(await member_page(db, page, shape))
+
+async def trainer_list(db: AsyncSession, statement, shape: Shape) -> bytes:
+    page = statement.subquery()
+    if uses_json_aggregation(db):
+        return (await db.exec(select(as_text(json_array(postgres_trainer(page.c, shape), page.c.id))).select_from(page))).one().encode()
+    return orjson.dumps(await trainer_page(db, page, shape))
+
+async def class_list(db: AsyncSession, statement, shape: Shape) -> bytes:
+    page = statement.subquery()
+    if uses_json_aggregation(db):
+        return (await db.exec(select(as_text(json_array(postgres_class(page.c, trainer_name(page.c.trainer_id), shape), page.c.id))).select_from(page))).one().encode()
+    return orjson.dumps(await class_page(db, page, shape))
+
+# BATCH READS
+# {"items": [...], "missing": [...]} for a list of ids, items in the order the ids were given: one IN
+# query for the rows, with the relationships loaded as a list page loads them (see above)
+def request_order(ids: list[int], column):
+    return case({id: position for position, id in enumerate(ids)}, value=column)
+
+async def batch(db: AsyncSession, ids: list[int], page, postgres_document, generic_page) -> bytes:
+    if len(ids) == 0:
+        return b'{"items":[],"missing":[]}'
+    if uses_json_aggregation(db):
+        body, found = (await db.exec(select(as_text(json_array(postgres_document(page.c), request_order(ids, page.c.id))), func.array_agg(page.c.id)).select_from(page))).one()
+        body, found = body.encode(), set(found or [])
+    else:
+        position = {id: index for index, id in enumerate(ids)}
+        documents = sorted(await generic_page(db, page), key=lambda document: position[document["id"]])
+        body, found = orjson.dumps(documents), {document["id"] for document in documents}
+    return b'{"items":' + body + b',"missing":' + orjson.dumps([id for id in ids if id not in found]) + b"}"
+
+async def member_batch(db: AsyncSession, ids: list[int], shape: Shape) -> bytes:
+    return await batch(db, ids, select(Member).where(Member.id.in_(ids)).subquery(), lambda member: postgres_member(member, shape), lambda db, page: member_page(db, page, shape))
+
+async def trainer_batch(db: AsyncSession, ids: list[int], shape: Shape) -> bytes:
+    return await batch(db, ids, select(Trainer).where(Trainer.id.in_(ids)).subquery(), lambda trainer: postgres_trainer(trainer, shape), lambda db, page: trainer_page(db, page, shape))
+
+async def class_batch(db: AsyncSession, ids: list[int], shape: Shape) -> bytes:
+    return await batch(db, ids, select(Class).where(Class.id.in_(ids)).subquery(), lambda course: postgres_class(course, trainer_name(course.trainer_id), shape), lambda db, page: class_page(db, page, shape))
+
+# (body, ETag, cache dependencies) for the by-id routes, or None if there's no such row
+async def member_document(db: AsyncSession, member_id: int, shape: Shape) -> tuple[bytes, str, list[tuple]] | None:
+    if uses_json_aggregation(db):
+        return await postgres_member_document(db, member_id, shape)
+    return await generic_member_document(db, member_id, shape)
+
+async def trainer_document(db: AsyncSession, trainer_id: int, shape: Shape) -> tuple[bytes, str, list[tuple]] | None:
+    if uses_json_aggregation(db):
+        return await postgres_trainer_document(db, trainer_id, shape)
+    return await generic_trainer_document(db, trainer_id, shape)
+
+async def class_document(db: AsyncSession, class_id: int, shape: Shape) -> tuple[bytes, str, list[tuple]] | None:
+    if uses_json_aggregation(db):
+        return await postgres_class_document(db, class_id, shape)
+    return await generic_class_document(db, class_id, shape)
@@ -0,0 +1,63 @@
+import csv
+import io
+from datetime import datetime, timedelta
+
+import orjson
+from decouple import config
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Attendance, Class, Member, Trainer, as_utc, utc_now
+
+# Bulk export as CSV (with a header row) or NDJSON, streamed from a server-side cursor a batch at a time
+# so memory stays flat however many rows there are. The CSV reimports with importer.py.
+#
+# since= limits an export to rows changed at or after that time (updated_at, see models.py). Attendance
+# has no timestamps of its own, but every check-in or removal bumps its class, so an incremental
+# attendance export is the whole attendance of each changed class: replace those classes' rows with it.
+# Deleted rows never appear in an incremental export; a periodic full export picks them up.
+
+EXPORT_BATCH_SIZE = config("EXPORT_BATCH_SIZE", default=1000, cast=int)
+# updated_at is stamped before commit, so a write still open when an export starts can commit rows stamped
+# earlier than the export (and a replica can be behind); the next since handed back overlaps by this many
+# seconds to catch them
+EXPORT_SINCE_OVERLAP = config("EXPORT_SINCE_OVERLAP", default=60, cast=int)
+
+MODELS = {"members": Member, "trainers": Trainer, "classes": Class, "attendance": Attendance}
+COLUMNS = {
+    "members": [Member.id, Member.name, Member.active, Member.version, Member.updated_at],
+    "trainers": [Trainer.id, Trainer.name, Trainer.specialty, Trainer.version, Trainer.updated_at],
+    "classes": [Class.id, Class.name, Class.trainer_id, Class.date, Class.duration, Class.version, Class.updated_at],
+    "attendance": [Attendance.class_id, Attendance.member_id, Attendance.checked_in_at, Attendance.source],
+}
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+def next_since() -> datetime:
+    # Taken before the export's query starts; pass it back as since for the next incremental export
+    return utc_now() - timedelta(seconds=EXPORT_SINCE_OVERLAP)
+
+def export_statement(entity: str, since: datetime | None = None):
+    statement = select(*COLUMNS[entity])
+    if since == None:
+        return statement
+    since = as_utc(since)
+    if entity == "attendance":
+        return statement.where(Attendance.class_id.in_(select(Class.id).where(Class.updated_at >= since)))
+    return statement.where(MODELS[entity].updated_at >= since)
+
+def encode_csv(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows)
+    return buffer.getvalue().encode()
+
+async def export_rows(db: AsyncSession, statement, format: str):
+    # Yields the encoded rows a batch at a time
+    names = list(statement.selected_columns.keys())
+    if format == "csv":
+        yield encode_csv([names])
+    result = await db.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for rows in result.partitions():
+        if format == "csv":
+            yield encode_csv(rows)
+        else:
+            yield b"".join(orjson.dumps(dict(zip(names, row))) + b"\n" for row in rows)
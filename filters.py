@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Attendance, Class, Member
+
+# WHERE clauses for the list routes; they go under the keyset paging, so every filter pages like the
+# unfiltered list. Names match case-insensitively against the lower(name) indexes in models.py:
+#   name   = prefix, served by the index on both databases
+#   search = substring, which no b-tree can serve, so it scans; narrow it with the other filters
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def name_filters(db: AsyncSession, column, prefix: str | None, search: str | None) -> list:
+    lowered = func.lower(column)
+    clauses = []
+    if prefix != None and prefix != "":
+        prefix = prefix.lower()
+        if db.bind.dialect.name == "postgresql":
+            # text_pattern_ops makes LIKE 'prefix%' an index range scan whatever the database collation
+            clauses.append(lowered.like(escape_like(prefix) + "%", escape="\\"))
+        else:
+            # SQLite only optimizes LIKE on plain columns, so spell the prefix out as a range on lower(name)
+            clauses += [lowered >= prefix, lowered < prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+    if search != None and search != "":
+        clauses.append(lowered.like("%" + escape_like(search.lower()) + "%", escape="\\"))
+    return clauses
+
+def member_filters(db: AsyncSession, name: str | None = None, search: str | None = None, active: bool | None = None, class_id: int | None = None) -> list:
+    clauses = name_filters(db, Member.name, name, search)
+    if active != None:
+        clauses.append(Member.active == active)
+    if class_id != None:
+        # Members who attended the class; the attendance primary key starts with class_id
+        clauses.append(Member.id.in_(select(Attendance.member_id).where(Attendance.class_id == class_id)))
+    return clauses
+
+def class_filters(db: AsyncSession, name: str | None = None, search: str | None = None, trainer_id: int | None = None, start_date: datetime | None = None, end_date: datetime | None = None) -> list:
+    clauses = name_filters(db, Class.name, name, search)
+    if trainer_id != None:
+        clauses.append(Class.trainer_id == trainer_id)
+    # Same [start_date, end_date) window as the attendance reports; Class.date has no zone, so the routes take
+    # these as NaiveDatetime and refuse an offset rather than guess what it would mean for the schedule
+    if start_date != None:
+        clauses.append(Class.date >= start_date)
+    if end_date != None:
+        clauses.append(Class.date < end_date)
+    return clauses
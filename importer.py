@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import csv
+import io
+import itertools
+
+import orjson
+from decouple import config
+from fastapi import HTTPException, status
+from pydantic import ValidationError
+from sqlalchemy import DateTime, Integer, String, column, insert, table, text
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import attendance_summary
+import versions
+from cache import response_cache
+from database import engine, upsert
+from models import Attendance, Class, ImportJob, Member, Trainer, utc_now
+from schemas import CreateClassRequest, CreateMemberRequest, CreateTrainerRequest, ImportCheckInRequest
+
+# Bulk loading from CSV (with a header row) or NDJSON. Rows are validated against the same request
+# models as the create/check-in endpoints and loaded a chunk per transaction: COPY on Postgres, an
+# executemany INSERT on SQLite. A named job records how many rows it has committed in the same
+# transaction as each chunk, so rerunning it with the same file carries on after the last good chunk.
+#
+#   python -m importer attendance history.csv --job history
+
+IMPORT_CHUNK_SIZE = config("IMPORT_CHUNK_SIZE", default=5000, cast=int)
+# Failed rows are all counted, but only this many are reported back
+IMPORT_MAX_ERRORS = config("IMPORT_MAX_ERRORS", default=1000, cast=int)
+
+REQUESTS = {"members": CreateMemberRequest, "trainers": CreateTrainerRequest, "classes": CreateClassRequest, "attendance": ImportCheckInRequest}
+FORMATS = ["csv", "ndjson"]
+
+# Attendance is staged and merged with INSERT ... SELECT, since COPY has no ON CONFLICT
+attendance_staging = table("import_attendance", column("class_id", Integer), column("member_id", Integer), column("checked_in_at", DateTime), column("source", String))
+
+def read_rows(file, format: str):
+    # Yields a dict per record, or the exception that stopped a line from parsing
+    lines = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        # An empty cell counts as missing, so optional columns fall back to their defaults
+        for row in csv.DictReader(lines):
+            yield {key: value for key, value in row.items() if value != ""}
+        return
+    for line in lines:
+        if line.strip() == "":
+            continue
+        try:
+            yield orjson.loads(line)
+        except orjson.JSONDecodeError as error:
+            yield error
+
+def error_messages(error: ValidationError) -> list[str]:
+    return [f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()]
+
+async def copy_rows(db: AsyncSession, model_table, rows: list[dict]):
+    # COPY on Postgres, an executemany INSERT elsewhere
+    if db.bind.dialect.name == "postgresql":
+        columns = list(rows[0])
+        connection = await (await db.connection()).get_raw_connection()
+        if not connection.driver_connection.is_in_transaction():
+            # The asyncpg adapter only sends BEGIN along with its first statement, and COPY goes around it;
+            # without this a chunk's rows would commit on their own, apart from its progress
+            await db.exec(text("SELECT 1"))
+        await connection.driver_connection.copy_records_to_table(model_table.name, records=[tuple(row[name] for name in columns) for row in rows], columns=columns)
+    else:
+        await db.exec(insert(model_table), params=rows)
+
+async def existing_ids(db: AsyncSession, model, ids: set[int]) -> set[int]:
+    return set((await db.exec(select(model.id).where(model.id.in_(ids)))).all()) if len(ids) > 0 else set()
+
+class ImportRun:
+    def __init__(self, db: AsyncSession, entity: str, job: str | None):
+        self.db = db
+        self.entity = entity
+        self.job = job
+        self.resumed_from = 0
+        self.rows = 0
+        self.imported = 0
+        self.already_present = 0
+        self.failed = 0
+        self.errors = []
+        # Totals over every run of the job, as stored in import_job
+        self.totals = {"rows_done": 0, "imported": 0, "failed": 0}
+
+    def fail(self, row: int, messages: list[str]):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_ERRORS:
+            self.errors.append({"row": row, "errors": messages})
+
+    async def resume(self) -> int:
+        if self.job == None:
+            return 0
+        stored: ImportJob | None = await self.db.get(ImportJob, self.job)
+        if stored == None:
+            return 0
+        if stored.entity != self.entity:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Import job {self.job} is importing {stored.entity}, not {self.entity}")
+        self.totals = {"rows_done": stored.rows_done, "imported": stored.imported, "failed": stored.failed}
+        self.resumed_from = stored.rows_done
+        return stored.rows_done
+
+    async def load(self, requests: list[tuple[int, object]]) -> list[tuple]:
+        # Inserts the valid requests of a chunk; returns the cache entries to invalidate after commit
+        if self.entity in ("members", "trainers"):
+            model = Member if self.entity == "members" else Trainer
+            if len(requests) > 0:
+                # COPY skips the model's Python-side defaults, so version and updated_at are given explicitly
+                await copy_rows(self.db, model.__table__, [{**request.model_dump(), "version": 1, "updated_at": utc_now()} for _, request in requests])
+            self.imported += len(requests)
+            return []
+
+        if self.entity == "classes":
+            trainer_ids = await existing_ids(self.db, Trainer, {request.trainer_id for _, request in requests})
+            valid = []
+            for row, request in requests:
+                if request.trainer_id in trainer_ids:
+                    valid.append(request)
+                else:
+                    self.fail(row, [f"trainer_id: Trainer with ID of {request.trainer_id} not found"])
+            if len(valid) > 0:
+                await versions.bump(self.db, Trainer, Trainer.id.in_({request.trainer_id for request in valid}))
+                await copy_rows(self.db, Class.__table__, [{**request.model_dump(), "version": 1, "updated_at": utc_now()} for request in valid])
+            self.imported += len(valid)
+            return [("trainer", trainer_id) for trainer_id in {request.trainer_id for request in valid}]
+
+        class_ids = await existing_ids(self.db, Class, {request.class_id for _, request in requests})
+        member_ids = await existing_ids(self.db, Member, {request.member_id for _, request in requests})
+        # The first row for a pair wins; rows without a checked_in_at are stamped with the time of the chunk
+        pairs, valid_rows, now = {}, 0, utc_now()
+        for row, request in requests:
+            if request.class_id not in class_ids:
+                self.fail(row, [f"class_id: Class with ID of {request.class_id} not found"])
+            elif request.member_id not in member_ids:
+                self.fail(row, [f"member_id: Member with ID of {request.member_id} not found"])
+            else:
+                pairs.setdefault((request.class_id, request.member_id), {"class_id": request.class_id, "member_id": request.member_id, "checked_in_at": request.checked_in_at or now, "source": request.source})
+                valid_rows += 1
+        inserted = set()
+        if len(pairs) > 0:
+            returning = (Attendance.class_id, Attendance.member_id, Attendance.checked_in_at)
+            if self.db.bind.dialect.name == "postgresql":
+                await self.db.exec(text("CREATE TEMPORARY TABLE import_attendance (class_id integer, member_id integer, checked_in_at timestamp, source varchar) ON COMMIT DROP"))
+                await copy_rows(self.db, attendance_staging, list(pairs.values()))
+                statement = upsert(self.db, Attendance).from_select(["class_id", "member_id", "checked_in_at", "source"], select(*attendance_staging.c))
+                inserted = {tuple(row) for row in (await self.db.exec(statement.on_conflict_do_nothing().returning(*returning))).all()}
+            else:
+                statement = upsert(self.db, Attendance).on_conflict_do_nothing().returning(*returning)
+                inserted = {tuple(row) for row in (await self.db.exec(statement, params=list(pairs.values()))).all()}
+            await attendance_summary.record_check_ins(self.db, [(class_id, checked_in_at) for class_id, _, checked_in_at in inserted])
+            await versions.bump(self.db, Class, Class.id.in_({class_id for class_id, _, _ in inserted}))
+            await versions.bump(self.db, Member, Member.id.in_({member_id for _, member_id, _ in inserted}))
+        # A pair repeated in the file, or already checked in, is not an error
+        self.imported += len(inserted)
+        self.already_present += valid_rows - len(inserted)
+        return [("class", class_id) for class_id, _, _ in inserted] + [("member", member_id) for _, member_id, _ in inserted]
+
+    async def chunk(self, records: list[tuple[int, object]]):
+        failed, imported = self.failed, self.imported
+        requests = []
+        for row, record in records:
+            if isinstance(record, Exception):
+                self.fail(row, [str(record)])
+                continue
+            try:
+                requests.append((row, REQUESTS[self.entity].model_validate(record)))
+            except ValidationError as error:
+                self.fail(row, error_messages(error))
+        invalidated = await self.load(requests)
+        self.rows += len(records)
+        if self.job != None:
+            self.totals = {"rows_done": self.totals["rows_done"] + len(records), "imported": self.totals["imported"] + self.imported - imported, "failed": self.totals["failed"] + self.failed - failed}
+            statement = upsert(self.db, ImportJob).values(name=self.job, entity=self.entity, **self.totals)
+            await self.db.exec(statement.on_conflict_do_update(index_elements=[ImportJob.name], set_=self.totals))
+        await self.db.commit()
+        response_cache.invalidate(*invalidated)
+
+    def report(self) -> dict:
+        return {"entity": self.entity, "job": self.job, "resumed_from": self.resumed_from, "rows": self.rows, "imported": self.imported, "already_present": self.already_present, "failed": self.failed, "errors": self.errors}
+
+async def import_file(db: AsyncSession, entity: str, file, format: str, job: str | None = None, on_chunk=None) -> dict:
+    # file is a binary file object; rows are numbered from 1, not counting a CSV header
+    run = ImportRun(db, entity, job)
+    skip = await run.resume()
+    records = itertools.islice(enumerate(read_rows(file, format), start=1), skip, None)
+    while True:
+        records_chunk = list(itertools.islice(records, IMPORT_CHUNK_SIZE))
+        if len(records_chunk) == 0:
+            break
+        await run.chunk(records_chunk)
+        if on_chunk != None:
+            on_chunk(run)
+    return run.report()
+
+async def main():
+    parser = argparse.ArgumentParser(description="Import members, trainers, classes or attendance from a CSV or NDJSON file")
+    parser.add_argument("entity", choices=REQUESTS)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument("--job", help="name for resumable progress; rerun with the same name to continue")
+    args = parser.parse_args()
+    format = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+
+    def progress(run: ImportRun):
+        print(f"{run.resumed_from + run.rows} rows: {run.imported} imported, {run.already_present} already present, {run.failed} failed", flush=True)
+
+    with open(args.path, "rb") as file:
+        async with AsyncSession(engine) as db:
+            try:
+                report = await import_file(db, args.entity, file, format, args.job, progress)
+            except HTTPException as error:
+                raise SystemExit(error.detail)
+    for error in report["errors"]:
+        print(f"row {error['row']}: {'; '.join(error['errors'])}")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+import logging
+import time
+from contextvars import ContextVar
+
+from decouple import config
+from prometheus_client import CollectorRegistry, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# Requests slower than this log their SQL; 0 turns the slow-request log off
+SLOW_REQUEST_SECONDS = config("SLOW_REQUEST_SECONDS", default=0, cast=float)
+
+logger = logging.getLogger("fantastic_fitness.slow_requests")
+
+registry = CollectorRegistry()
+request_seconds = Histogram("http_request_duration_seconds", "Request latency", ["method", "route", "status"], registry=registry)
+request_queries = Histogram("http_request_db_queries", "SQL statements per request", ["method", "route"], buckets=[0, 1, 2, 3, 5, 10, 20, 50, 100, 500], registry=registry)
+request_db_seconds = Histogram("http_request_db_seconds", "Time spent in SQL per request", ["method", "route"], registry=registry)
+request_rows = Histogram("http_request_db_rows", "Rows fetched per request", ["method", "route"], buckets=[0, 1, 10, 100, 1000, 10000, 100000, 1000000], registry=registry)
+response_bytes = Histogram("http_response_size_bytes", "Response body size", ["method", "route"], buckets=[100, 1000, 10000, 100000, 1000000, 10000000], registry=registry)
+
+class RequestStats:
+    # What one request did in the database; filled in by the engine hooks in database.py
+    def __init__(self, capture_statements: bool):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.statements: list[tuple[str, float]] | None = [] if capture_statements else None
+
+    def record_query(self, statement: str, seconds: float, rows: int):
+        self.queries += 1
+        self.db_seconds += seconds
+        self.rows += rows
+        if self.statements != None:
+            self.statements.append((statement, seconds))
+
+# Set for the duration of each request; queries outside a request (startup, CLI) aren't attributed
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+def record_query(statement: str, seconds: float, rows: int):
+    stats = current_request.get()
+    if stats != None:
+        stats.record_query(statement, seconds, rows)
+
+class MetricsMiddleware:
+    # Plain ASGI middleware rather than BaseHTTPMiddleware so streamed bodies are counted as they go out
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats(capture_statements=SLOW_REQUEST_SECONDS > 0)
+        token = current_request.set(stats)
+        response = {"status": 500, "bytes": 0}
+
+        async def send_and_count(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_count)
+        finally:
+            seconds = time.perf_counter() - start
+            current_request.reset(token)
+            # Label by route template, not raw path, so ids don't explode the label set
+            route = scope["route"].path if "route" in scope else "unmatched"
+            method = scope["method"]
+            request_seconds.labels(method, route, response["status"]).observe(seconds)
+            request_queries.labels(method, route).observe(stats.queries)
+            request_db_seconds.labels(method, route).observe(stats.db_seconds)
+            request_rows.labels(method, route).observe(stats.rows)
+            response_bytes.labels(method, route).observe(response["bytes"])
+            if stats.statements != None and seconds >= SLOW_REQUEST_SECONDS:
+                logger.warning("Slow request %s %s: %.3fs, %d queries, %.3fs in SQL\n%s", method, scope["path"], seconds, stats.queries, stats.db_seconds, "\n".join(f"  [{query_seconds * 1000:.1f}ms] {' '.join(statement.split())}" for statement, query_seconds in stats.statements))
+
+def metrics_text() -> tuple[bytes, str]:
+    return generate_latest(registry), CONTENT_TYPE_LATEST
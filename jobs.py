@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+import orjson
+from decouple import config
+from fastapi import HTTPException, status
+from fastapi.responses import Response
+from pydantic import BaseModel
+from sqlalchemy import and_, delete, or_, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from database import engine
+from models import ReportJob, utc_now
+
+# Reports too heavy to answer inline: ?background=true on a report route queues it and answers 202 with a
+# job, which GET /jobs/{id} polls (long-polls with ?wait=). REPORT_WORKERS tasks work the queue, each with
+# a session of its own, so however many reports are asked for, at most that many pool connections go to
+# them. Results are kept in report_job. The same report with the same parameters asked for again gets the
+# job already queued or running, or one finished in the last REPORT_JOB_TTL seconds, rather than a new run.
+# A report runs against the database the request would have read (the replica, see database.py); job
+# rows are always read and written on the primary.
+
+REPORT_WORKERS = config("REPORT_WORKERS", default=2, cast=int)
+REPORT_QUEUE_SIZE = config("REPORT_QUEUE_SIZE", default=100, cast=int)
+REPORT_JOB_TTL = config("REPORT_JOB_TTL", default=300, cast=int)
+REPORT_JOB_TIMEOUT = config("REPORT_JOB_TIMEOUT", default=600, cast=int)
+REPORT_JOB_RETENTION = config("REPORT_JOB_RETENTION", default=86400, cast=int)
+# Long polls are capped at this; a job running in another worker process is checked this often
+REPORT_WAIT_MAX = 30
+REPORT_POLL_INTERVAL = 0.5
+
+FINISHED = ("done", "failed")
+
+logger = logging.getLogger("fantastic_fitness.report_jobs")
+
+def encode_result(value) -> bytes:
+    return orjson.dumps(value, default=lambda model: model.model_dump() if isinstance(model, BaseModel) else str(model))
+
+def job_response(job: ReportJob, status_code: int = status.HTTP_200_OK, headers: dict | None = None) -> Response:
+    job_status, error = job.status, job.error
+    # Queued or running past the timeout means the process running it went away
+    if job_status not in FINISHED and job.created_at < utc_now() - timedelta(seconds=REPORT_JOB_TIMEOUT):
+        job_status, error = "failed", "Job was lost before it finished"
+    body = {"id": job.id, "report": job.report, "params": orjson.loads(job.params), "status": job_status, "created_at": job.created_at, "started_at": job.started_at, "finished_at": job.finished_at, "error": error, "result": orjson.loads(job.result) if job.result != None else None}
+    return Response(content=orjson.dumps(body), status_code=status_code, media_type="application/json", headers=headers)
+
+class ReportJobs:
+    def __init__(self, workers: int, queue_size: int):
+        self.worker_count = workers
+        self.queue_size = queue_size
+        self.queue: asyncio.Queue | None = None
+        self.workers: list[asyncio.Task] = []
+        # Jobs queued or running in this process: id -> set when finished, and (report, params) -> id
+        self.finished: dict[str, asyncio.Event] = {}
+        self.pending: dict[tuple[str, str], str] = {}
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.workers = [asyncio.create_task(self.work()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def submit(self, read_db: AsyncSession, report: str, run, **params) -> Response:
+        # run is called as run(**params, db=session) in a worker, with a session on read_db's database, and
+        # returns the report's response
+        async with AsyncSession(engine) as db:
+            return await self.queue_job(db, read_db.bind, report, run, params)
+
+    async def queue_job(self, db: AsyncSession, bind, report: str, run, params: dict) -> Response:
+        encoded = orjson.dumps(params, option=orjson.OPT_SORT_KEYS).decode()
+        job_id = self.pending.get((report, encoded))
+        if job_id == None:
+            now = utc_now()
+            recent = or_(and_(ReportJob.status == "done", ReportJob.finished_at >= now - timedelta(seconds=REPORT_JOB_TTL)), and_(ReportJob.status.in_(["queued", "running"]), ReportJob.created_at >= now - timedelta(seconds=REPORT_JOB_TIMEOUT)))
+            job_id = (await db.exec(select(ReportJob.id).where(ReportJob.report == report, ReportJob.params == encoded, recent).order_by(ReportJob.created_at.desc()).limit(1))).first()
+        if job_id != None:
+            job: ReportJob = await db.get(ReportJob, job_id)
+            return job_response(job, status.HTTP_202_ACCEPTED, {"Location": f"/jobs/{job_id}"})
+
+        # Without the app's lifespan (start/stop) nothing would ever take the job off the queue
+        if self.queue == None or len(self.workers) == 0:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Report workers are not running")
+        if self.queue.full():
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Report queue is full, try again later")
+        job_id = uuid.uuid4().hex
+        job = ReportJob(id=job_id, report=report, params=encoded)
+        # Built before the commit expires the job's attributes
+        response = job_response(job, status.HTTP_202_ACCEPTED, {"Location": f"/jobs/{job_id}"})
+        db.add(job)
+        await db.commit()
+        self.finished[job_id] = asyncio.Event()
+        self.pending[(report, encoded)] = job_id
+        self.queue.put_nowait((job_id, bind, report, encoded, run, params))
+        return response
+
+    async def work(self):
+        while True:
+            job_id, bind, report, encoded, run, params = await self.queue.get()
+            try:
+                async with AsyncSession(engine) as db:
+                    await db.exec(update(ReportJob).where(ReportJob.id == job_id).values(status="running", started_at=utc_now()))
+                    await db.commit()
+                    try:
+                        async with AsyncSession(bind) as read_db:
+                            result = {"status": "done", "result": encode_result(await asyncio.wait_for(run(**params, db=read_db), REPORT_JOB_TIMEOUT)).decode()}
+                    except asyncio.TimeoutError:
+                        result = {"status": "failed", "error": f"Report took longer than {REPORT_JOB_TIMEOUT} seconds"}
+                    except HTTPException as error:
+                        result = {"status": "failed", "error": str(error.detail)}
+                    except Exception as error:
+                        result = {"status": "failed", "error": f"{type(error).__name__}: {error}"}
+                    now = utc_now()
+                    await db.exec(update(ReportJob).where(ReportJob.id == job_id).values(**result, finished_at=now))
+                    await db.exec(delete(ReportJob).where(ReportJob.finished_at < now - timedelta(seconds=REPORT_JOB_RETENTION)))
+                    await db.commit()
+            except Exception:
+                # The job row couldn't be written; it reads as lost once it passes the timeout
+                logger.exception("Report job %s (%s) could not be recorded", job_id, report)
+            finally:
+                self.pending.pop((report, encoded), None)
+                self.finished.pop(job_id).set()
+                self.queue.task_done()
+
+    async def get(self, db: AsyncSession, job_id: str, wait: float = 0) -> Response:
+        deadline = time.monotonic() + min(wait, REPORT_WAIT_MAX)
+        while True:
+            job: ReportJob | None = await db.get(ReportJob, job_id)
+            if job == None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Job with ID of {job_id} not found")
+            remaining = deadline - time.monotonic()
+            if job.status in FINISHED or remaining <= 0:
+                return job_response(job)
+            # Give the connection back to the pool while waiting
+            await db.rollback()
+            finished = self.finished.get(job_id)
+            try:
+                if finished != None:
+                    await asyncio.wait_for(finished.wait(), remaining)
+                else:
+                    await asyncio.sleep(min(REPORT_POLL_INTERVAL, remaining))
+            except asyncio.TimeoutError:
+                pass
+
+report_jobs = ReportJobs(REPORT_WORKERS, REPORT_QUEUE_SIZE)
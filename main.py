@@ -1,12 +1,40 @@
-from fastapi import Depends, FastAPI, status, HTTPException, APIRouter
-from sqlmodel import Session, select, Field
-from sqlalchemy import func
-from database import get_db
-
-from models import Member, Trainer, Class, Attendance
-from schemas import GetMemberResponse, GetTrainerResponse, GetClassResponse, AttendancePerClassResponse, AttendancePerTrainerResponse, ClassResponse, CreateMemberRequest, CreateTrainerRequest, CreateClassRequest, UpdateMemberRequest, UpdateTrainerRequest, UpdateClassRequest
-
-app = FastAPI()
+from fastapi import Depends, FastAPI, status, HTTPException, APIRouter, Query, Header, Request
+from fastapi.responses import StreamingResponse, Response
+from sqlmodel import select, Field
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import func, insert, delete, extract, Float, cast
+from sqlalchemy.exc import IntegrityError
+from contextlib import asynccontextmanager
+from typing import Literal
+import tempfile
+import orjson
+from datetime import datetime
+from pydantic import NaiveDatetime
+from database import get_db, get_read_db, read_engine, read_time, dispose_engines, warm_pool, pool_metrics, upsert, ReadYourWritesMiddleware
+from instrumentation import MetricsMiddleware, metrics_text
+
+import attendance_summary
+import documents
+import exporter
+import filters
+import importer
+from jobs import report_jobs
+from documents import build_member_response, build_trainer_response, build_class_response
+from cache import response_cache
+import versions
+from versions import etag_matches
+from models import Member, Trainer, Class, Attendance, AttendanceSummary, AttendanceRollup, as_utc, utc_now
+from schemas import GetMemberResponse, GetTrainerResponse, GetClassResponse, AttendancePerClassResponse, AttendancePerTrainerResponse, CreateMemberRequest, CreateTrainerRequest, CreateClassRequest, UpdateMemberRequest, UpdateTrainerRequest, UpdateClassRequest, CheckInRequest, BatchCheckInResponse, PoolMetricsResponse, AttendanceDriftResponse, AttendanceByDayOfWeekResponse, CacheMetricsResponse, TrainerLeaderboardResponse, ImportResponse, CheckInsPerIntervalResponse, CheckInsByHourOfDayResponse, ReportJobResponse, LookupRequest, MemberBatchResponse, TrainerBatchResponse, ClassBatchResponse, BulkDeleteResponse
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await warm_pool()
+    await report_jobs.start()
+    yield
+    await report_jobs.stop()
+    await dispose_engines()
+
+app = FastAPI(lifespan=lifespan)
 router = APIRouter()
 
 from fastapi.middleware.cors import CORSMiddleware
@@ -16,249 +44,607 @@ app.add_middleware(
     allow_methods = ["*"],
     allow_headers = ["*"],
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+
+# LIST HELPERS
+PAGE_LIMIT_MAX = 1000
+STREAM_BATCH_SIZE = 500
+
+def list_response(body: bytes) -> Response:
+    # The annotations on the list routes still carry the schemas.py models for OpenAPI, but returning a
+    # Response skips FastAPI's validate-and-reserialize pass
+    return Response(content=body, media_type="application/json")
+
+def paginate(statement, id_column, after_id: int | None, limit: int | None):
+    # Keyset paging on the primary key: pass the last id of a page as after_id to get the next one
+    statement = statement.order_by(id_column)
+    if after_id != None:
+        statement = statement.where(id_column > after_id)
+    if limit != None:
+        statement = statement.limit(limit)
+    return statement
+
+def stream_json(db: AsyncSession, statement, build_response) -> StreamingResponse:
+    # Writes the JSON array one row at a time from a server-side cursor so memory stays flat.
+    # The session is owned by the generator because it outlives the request's session; it reads from the
+    # same database as db.
+    bind = db.bind
+    async def generate():
+        async with AsyncSession(bind) as session:
+            yield b"["
+            index = 0
+            async for row in await session.stream_scalars(statement.execution_options(yield_per=STREAM_BATCH_SIZE)):
+                yield (b"," if index else b"") + orjson.dumps(build_response(row))
+                index += 1
+            yield b"]"
+    return StreamingResponse(generate(), media_type="application/json")
+
+def parse_ids(ids: str) -> list[int]:
+    try:
+        return [int(id) for id in documents.split(ids)]
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"ids must be comma-separated integers, not {ids}")
+
+async def batch_response(db: AsyncSession, ids: list[int], shape, batch) -> Response:
+    # Repeated ids are answered once, where they first appear
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > PAGE_LIMIT_MAX:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"At most {PAGE_LIMIT_MAX} ids can be fetched at once, not {len(ids)}")
+    return list_response(await batch(db, ids, shape))
 
 # GET
+# ?ids=3,1,2 answers {"items": [...], "missing": [...]} with those rows in that order, in place of a page;
+# the paging and filter parameters don't apply. POST .../lookup takes the ids in the body for long lists.
 @router.get("/members", tags=["members"])
-async def get_members(db: Session = Depends(get_db)) -> list[GetMemberResponse]:
-    return [GetMemberResponse(id=member.id, name=member.name, active=member.active, classes=[ClassResponse(name=course.name, trainer_id=course.trainer_id, date=course.date, duration=course.duration) for course in member.classes]) for member in db.exec(select(Member)).all()]
+async def get_members(after_id: int | None = None, limit: int | None = Query(default=None, ge=1, le=PAGE_LIMIT_MAX), stream: bool = False, fields: str | None = None, expand: str | None = None, name: str | None = None, search: str | None = None, active: bool | None = None, class_id: int | None = None, ids: str | None = None, db: AsyncSession = Depends(get_read_db)) -> list[GetMemberResponse] | MemberBatchResponse:
+    shape = documents.shape_for("member", fields, expand)
+    if ids != None:
+        return await batch_response(db, parse_ids(ids), shape, documents.member_batch)
+    where = filters.member_filters(db, name, search, active, class_id)
+    if stream:
+        return stream_json(db, paginate(select(Member).where(*where).options(*documents.member_options(shape)), Member.id, after_id, limit), lambda member: build_member_response(member, shape))
+    return list_response(await documents.member_list(db, paginate(select(Member).where(*where), Member.id, after_id, limit), shape))
 
 @router.get("/trainers", tags=["trainers"])
-async def get_trainers(db: Session = Depends(get_db)) -> list[GetTrainerResponse]:
-    return [GetTrainerResponse(id=trainer.id, name=trainer.name, specialty=trainer.specialty, classes=[GetClassResponse(id=course.id, name=course.name, trainer_id=course.trainer_id, trainer=course.trainer.name, date=course.date, members=[member.name for member in course.members], duration=course.duration) for course in trainer.classes]) for trainer in db.exec(select(Trainer)).all()]
+async def get_trainers(after_id: int | None = None, limit: int | None = Query(default=None, ge=1, le=PAGE_LIMIT_MAX), stream: bool = False, fields: str | None = None, expand: str | None = None, ids: str | None = None, db: AsyncSession = Depends(get_read_db)) -> list[GetTrainerResponse] | TrainerBatchResponse:
+    shape = documents.shape_for("trainer", fields, expand)
+    if ids != None:
+        return await batch_response(db, parse_ids(ids), shape, documents.trainer_batch)
+    if stream:
+        return stream_json(db, paginate(select(Trainer).options(*documents.trainer_options(shape)), Trainer.id, after_id, limit), lambda trainer: build_trainer_response(trainer, shape))
+    return list_response(await documents.trainer_list(db, paginate(select(Trainer), Trainer.id, after_id, limit), shape))
 
 @router.get("/classes", tags=["classes"])
-async def get_classes(db: Session = Depends(get_db)) -> list[GetClassResponse]:
-    return [GetClassResponse(id=course.id, name=course.name, trainer_id=course.trainer_id, trainer=course.trainer.name, date=course.date, duration=course.duration, members=[member.name for member in course.members]) for course in db.exec(select(Class)).all()]
+async def get_classes(after_id: int | None = None, limit: int | None = Query(default=None, ge=1, le=PAGE_LIMIT_MAX), stream: bool = False, fields: str | None = None, expand: str | None = None, name: str | None = None, search: str | None = None, trainer_id: int | None = None, start_date: NaiveDatetime | None = None, end_date: NaiveDatetime | None = None, ids: str | None = None, db: AsyncSession = Depends(get_read_db)) -> list[GetClassResponse] | ClassBatchResponse:
+    shape = documents.shape_for("class", fields, expand)
+    if ids != None:
+        return await batch_response(db, parse_ids(ids), shape, documents.class_batch)
+    where = filters.class_filters(db, name, search, trainer_id, start_date, end_date)
+    if stream:
+        return stream_json(db, paginate(select(Class).where(*where).options(*documents.class_options(shape)), Class.id, after_id, limit), lambda course: build_class_response(course, shape))
+    return list_response(await documents.class_list(db, paginate(select(Class).where(*where), Class.id, after_id, limit), shape))
+
+# GET: MANY BY ID
+@router.post("/members/lookup", tags=["members"], status_code=status.HTTP_200_OK)
+async def lookup_members(lookup_request: LookupRequest, fields: str | None = None, expand: str | None = None, db: AsyncSession = Depends(get_read_db)) -> MemberBatchResponse:
+    return await batch_response(db, lookup_request.ids, documents.shape_for("member", fields, expand), documents.member_batch)
+
+@router.post("/trainers/lookup", tags=["trainers"], status_code=status.HTTP_200_OK)
+async def lookup_trainers(lookup_request: LookupRequest, fields: str | None = None, expand: str | None = None, db: AsyncSession = Depends(get_read_db)) -> TrainerBatchResponse:
+    return await batch_response(db, lookup_request.ids, documents.shape_for("trainer", fields, expand), documents.trainer_batch)
+
+@router.post("/classes/lookup", tags=["classes"], status_code=status.HTTP_200_OK)
+async def lookup_classes(lookup_request: LookupRequest, fields: str | None = None, expand: str | None = None, db: AsyncSession = Depends(get_read_db)) -> ClassBatchResponse:
+    return await batch_response(db, lookup_request.ids, documents.shape_for("class", fields, expand), documents.class_batch)
 
 # GET: BY ID
+def json_response(body: bytes, current_etag: str) -> Response:
+    return Response(content=body, media_type="application/json", headers={"ETag": current_etag})
+
+def cache_response(key: tuple, body: bytes, current_etag: str, dependencies: list[tuple], read_at: float) -> Response:
+    # read_at is taken before the route reads anything, so a write that lands meanwhile keeps it out of the cache
+    response_cache.set(key, (body, current_etag), dependencies, read_at)
+    return json_response(body, current_etag)
+
+async def conditional_response(key: tuple, if_none_match: str | None, lookup_etag) -> Response | None:
+    # Answers from the cache or with a 304 when possible; None means the caller has to load the entity
+    cached = response_cache.get(key)
+    if cached != None:
+        body, current_etag = cached
+        if etag_matches(if_none_match, current_etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": current_etag})
+        return json_response(body, current_etag)
+    if if_none_match != None:
+        current_etag = await lookup_etag()
+        if current_etag != None and etag_matches(if_none_match, current_etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": current_etag})
+    return None
+
 @router.get("/members/{member_id}", tags=["members"], status_code=status.HTTP_200_OK)
-async def get_member_by_id(member_id, db: Session = Depends(get_db)) -> GetMemberResponse:
-    member: Member | None = db.get(Member, member_id)
-    if member == None:
+async def get_member_by_id(member_id: int, fields: str | None = None, expand: str | None = None, if_none_match: str | None = Header(default=None), db: AsyncSession = Depends(get_read_db)) -> GetMemberResponse:
+    shape = documents.shape_for("member", fields, expand)
+    key = ("member", member_id, shape.key())
+    read_at = read_time(db)
+    response = await conditional_response(key, if_none_match, lambda: versions.lookup_member_etag(db, member_id, shape.expand))
+    if response != None:
+        return response
+    document = await documents.member_document(db, member_id, shape)
+    if document == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Member with ID of {member_id} not found")
-    return GetMemberResponse(id=member.id, name=member.name, active=member.active, classes=[ClassResponse(name=course.name, trainer_id=course.trainer_id, date=course.date, duration=course.duration) for course in member.classes])
+    body, current_etag, dependencies = document
+    return cache_response(key, body, current_etag, [("member", member_id)] + dependencies, read_at)
 
 @router.get("/trainers/{trainer_id}", tags=["trainers"], status_code=status.HTTP_200_OK)
-async def get_trainer_by_id(trainer_id, db: Session = Depends(get_db)) -> GetTrainerResponse:
-    trainer: Trainer | None = db.get(Trainer, trainer_id)
-    if trainer == None:
+async def get_trainer_by_id(trainer_id: int, fields: str | None = None, expand: str | None = None, if_none_match: str | None = Header(default=None), db: AsyncSession = Depends(get_read_db)) -> GetTrainerResponse:
+    shape = documents.shape_for("trainer", fields, expand)
+    key = ("trainer", trainer_id, shape.key())
+    read_at = read_time(db)
+    response = await conditional_response(key, if_none_match, lambda: versions.lookup_trainer_etag(db, trainer_id, shape.expand))
+    if response != None:
+        return response
+    document = await documents.trainer_document(db, trainer_id, shape)
+    if document == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Trainer with ID of {trainer_id} not found")
-    return GetTrainerResponse(id=trainer.id, name=trainer.name, specialty=trainer.specialty, classes=[ClassResponse(name=course.name, trainer_id=course.trainer_id, date=course.date, duration=course.duration) for course in trainer.classes])
+    body, current_etag, dependencies = document
+    return cache_response(key, body, current_etag, [("trainer", trainer_id)] + dependencies, read_at)
 
 @router.get("/classes/{class_id}", tags=["classes"], status_code=status.HTTP_200_OK)
-async def get_class_by_id(class_id: int, db: Session = Depends(get_db)) -> ClassResponse:
-    course: Class | None = db.get(Class, class_id)
-    if course == None:
+async def get_class_by_id(class_id: int, fields: str | None = None, expand: str | None = None, if_none_match: str | None = Header(default=None), db: AsyncSession = Depends(get_read_db)) -> GetClassResponse:
+    shape = documents.shape_for("class", fields, expand)
+    key = ("class", class_id, shape.key())
+    read_at = read_time(db)
+    response = await conditional_response(key, if_none_match, lambda: versions.lookup_class_etag(db, class_id, shape.expand))
+    if response != None:
+        return response
+    document = await documents.class_document(db, class_id, shape)
+    if document == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not found")
-    return GetClassResponse(id=course.id, name=course.name, trainer_id=course.trainer_id, trainer=course.trainer.name, date=course.date, members=[member.name for member in course.members], duration=course.duration)
+    body, current_etag, dependencies = document
+    return cache_response(key, body, current_etag, [("class", class_id)] + dependencies, read_at)
 
 # GET REPORTS
+# The whole-history reports take ?background=true to run as a job instead (jobs.py); poll GET /jobs/{job_id}
 # Attendance per class (count per class_id)
 @router.get("/attendance/classes", tags=["attendance"], status_code=status.HTTP_200_OK)
-async def get_attendance_per_class(db: Session = Depends(get_db)) -> list[AttendancePerClassResponse]:
-    final_results: list[AttendancePerClassResponse] = []
-    results = dict(db.exec(select(Attendance.class_id, func.count(Attendance.member_id).label("attendance_per_class")).group_by(Attendance.class_id)).all())
-    for k, v in results.items():
-        final_results.append(AttendancePerClassResponse(class_id=k, attendance_total=v))
-    return final_results
+async def get_attendance_per_class(background: bool = False, db: AsyncSession = Depends(get_read_db)) -> list[AttendancePerClassResponse]:
+    if background:
+        return await report_jobs.submit(db, "attendance/classes", get_attendance_per_class)
+    results = (await db.exec(select(AttendanceSummary.class_id, AttendanceSummary.attendance_total).where(AttendanceSummary.attendance_total > 0).order_by(AttendanceSummary.class_id))).all()
+    return [AttendancePerClassResponse(class_id=k, attendance_total=v) for k, v in results]
 
 @router.get("/attendance/classes/{class_id}", tags=["attendance"], status_code=status.HTTP_200_OK)
-async def get_attendance_per_class_id(class_id: int, db: Session = Depends(get_db)) -> AttendancePerClassResponse:
-    course: Class | None = db.get(Class, class_id)
-    if course == None:
+async def get_attendance_per_class_id(class_id: int, db: AsyncSession = Depends(get_read_db)) -> AttendancePerClassResponse:
+    result = (await db.exec(select(Class.id, func.coalesce(AttendanceSummary.attendance_total, 0)).outerjoin(AttendanceSummary, AttendanceSummary.class_id == Class.id).where(Class.id == class_id))).first()
+    if result == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not found")
-    if len(course.members) == 0:
-        return AttendancePerClassResponse(class_id= class_id, attendance_total=0)
-    results = dict(db.exec(select(Attendance.class_id, func.count(Attendance.member_id).label("attendance_per_class")).where(Attendance.class_id == class_id).group_by(Attendance.class_id)).all())
-    for k, v in results.items():
-        return AttendancePerClassResponse(class_id=k, attendance_total=v)
-
-
+    return AttendancePerClassResponse(class_id=class_id, attendance_total=result[1])
+
+
+
+#Trainer leaderboard (every trainer's attendance in one statement, optionally for classes within [start_date, end_date))
+# Class dates are wall-clock times with no zone, so the window can't carry an offset either (422)
+@router.get("/attendance/trainers", tags=["attendance"], status_code=status.HTTP_200_OK)
+async def get_trainer_leaderboard(start_date: NaiveDatetime | None = None, end_date: NaiveDatetime | None = None, offset: int = Query(default=0, ge=0), limit: int | None = Query(default=None, ge=1, le=PAGE_LIMIT_MAX), background: bool = False, db: AsyncSession = Depends(get_read_db)) -> list[TrainerLeaderboardResponse]:
+    if background:
+        return await report_jobs.submit(db, "attendance/trainers", get_trainer_leaderboard, start_date=start_date, end_date=end_date, offset=offset, limit=limit)
+    date_filters = []
+    if start_date != None:
+        date_filters.append(Class.date >= start_date)
+    if end_date != None:
+        date_filters.append(Class.date < end_date)
+    class_totals = select(Class.trainer_id, func.count(Class.id).label("class_count"), func.coalesce(func.sum(AttendanceSummary.attendance_total), 0).label("attendance_total")).outerjoin(AttendanceSummary, AttendanceSummary.class_id == Class.id).where(*date_filters).group_by(Class.trainer_id).cte("class_totals")
+    member_totals = select(Class.trainer_id, func.count(func.distinct(Attendance.member_id)).label("distinct_members")).join(Attendance, Attendance.class_id == Class.id).where(*date_filters).group_by(Class.trainer_id).cte("member_totals")
+    attendance_total = func.coalesce(class_totals.c.attendance_total, 0)
+    # Rank over every trainer before paging, so a page's ranks are the real ones
+    leaderboard = select(
+        Trainer.id.label("trainer_id"),
+        Trainer.name,
+        attendance_total.label("attendance_total"),
+        func.coalesce(member_totals.c.distinct_members, 0).label("distinct_members"),
+        func.coalesce(class_totals.c.class_count, 0).label("class_count"),
+        func.coalesce(cast(class_totals.c.attendance_total, Float) / func.nullif(class_totals.c.class_count, 0), 0).label("average_class_fill"),
+        func.rank().over(order_by=attendance_total.desc()).label("rank"),
+        func.percent_rank().over(order_by=attendance_total).label("percentile"),
+    ).outerjoin(class_totals, class_totals.c.trainer_id == Trainer.id).outerjoin(member_totals, member_totals.c.trainer_id == Trainer.id).subquery()
+    statement = select(*leaderboard.c).order_by(leaderboard.c.rank, leaderboard.c.trainer_id).offset(offset)
+    if limit != None:
+        statement = statement.limit(limit)
+    return [TrainerLeaderboardResponse(**row._asdict()) for row in (await db.exec(statement)).all()]
 
 #Attendance per trainer (how many members attend their classes)
 @router.get("/attendance/trainers/{trainer_id}", tags=["attendance"], status_code=status.HTTP_200_OK)
-async def get_attendance_per_trainer(trainer_id: int, db: Session = Depends(get_db)) -> AttendancePerTrainerResponse:
-    trainer: Trainer | None = db.get(Trainer, trainer_id)
+async def get_attendance_per_trainer(trainer_id: int, db: AsyncSession = Depends(get_read_db)) -> AttendancePerTrainerResponse:
+    trainer: Trainer | None = await db.get(Trainer, trainer_id)
     if trainer == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Trainer with ID of {trainer_id} not found")
-    results = dict(db.exec(select(Trainer.id, func.count(Class.members)).where(Class.trainer_id == trainer_id).group_by(Class.trainer_id)).all())
+    attendance_total = (await db.exec(select(func.coalesce(func.sum(AttendanceSummary.attendance_total), 0)).join(Class, Class.id == AttendanceSummary.class_id).where(Class.trainer_id == trainer_id))).one()
+    return AttendancePerTrainerResponse(trainer_id=trainer_id, attendance_total=attendance_total)
 
-    for k, v in results.items():
-        return AttendancePerTrainerResponse(trainer_id=k, attendance_total=v)
 
 
+# Rebuild the attendance summary and rollup from scratch and report any drift
+@router.post("/attendance/reconcile", tags=["attendance"], status_code=status.HTTP_200_OK)
+async def reconcile_attendance(db: AsyncSession = Depends(get_db)) -> list[AttendanceDriftResponse]:
+    return [AttendanceDriftResponse(**row) for row in await attendance_summary.reconcile(db)]
+
+#Most popular day of the week for classes (attendance per weekday, optionally within [start_date, end_date), naive as above)
+DAYS_OF_WEEK = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
 
-#Most popular day of the week for classes (group by date)
 @router.get("/attendance/day_of_week", tags=["attendance"], status_code=status.HTTP_200_OK)
-async def get_attendance_by_day_of_week(db: Session = Depends(get_db)):
-    return dict(db.exec(select(Class.date, func.count(Class.date)).group_by(Class.date)).all())
+async def get_attendance_by_day_of_week(start_date: NaiveDatetime | None = None, end_date: NaiveDatetime | None = None, background: bool = False, db: AsyncSession = Depends(get_read_db)) -> list[AttendanceByDayOfWeekResponse]:
+    if background:
+        return await report_jobs.submit(db, "attendance/day_of_week", get_attendance_by_day_of_week, start_date=start_date, end_date=end_date)
+    day_of_week = extract("dow", Class.date)
+    statement = select(day_of_week, func.sum(AttendanceSummary.attendance_total)).join(AttendanceSummary, AttendanceSummary.class_id == Class.id).group_by(day_of_week)
+    if start_date != None:
+        statement = statement.where(Class.date >= start_date)
+    if end_date != None:
+        statement = statement.where(Class.date < end_date)
+    totals = {int(k): v for k, v in (await db.exec(statement)).all()}
+    return [AttendanceByDayOfWeekResponse(day_of_week=day, attendance_total=totals.get(index, 0)) for index, day in enumerate(DAYS_OF_WEEK)]
+
+# Check-ins per hour or day, from attendance_rollup (optionally for hours within [start_date, end_date), one class or one trainer)
+def rollup_filters(start_date: datetime | None, end_date: datetime | None, class_id: int | None, trainer_id: int | None) -> list:
+    # Unlike the class-date reports above, the window here is on check-in time, which is UTC, so a start or end
+    # with an offset can be converted
+    clauses = [AttendanceRollup.check_ins > 0]
+    if start_date != None:
+        clauses.append(AttendanceRollup.hour >= as_utc(start_date))
+    if end_date != None:
+        clauses.append(AttendanceRollup.hour < as_utc(end_date))
+    if class_id != None:
+        clauses.append(AttendanceRollup.class_id == class_id)
+    if trainer_id != None:
+        clauses.append(AttendanceRollup.trainer_id == trainer_id)
+    return clauses
+
+@router.get("/attendance/check_ins", tags=["attendance"], status_code=status.HTTP_200_OK)
+async def get_check_ins(interval: Literal["hour", "day"] = "hour", start_date: datetime | None = None, end_date: datetime | None = None, class_id: int | None = None, trainer_id: int | None = None, background: bool = False, db: AsyncSession = Depends(get_read_db)) -> list[CheckInsPerIntervalResponse]:
+    if background:
+        return await report_jobs.submit(db, "attendance/check_ins", get_check_ins, interval=interval, start_date=start_date, end_date=end_date, class_id=class_id, trainer_id=trainer_id)
+    # Hours and days are UTC; days are summed from the hourly rows
+    bucket = AttendanceRollup.hour if interval == "hour" else attendance_summary.day_bucket(db.bind.dialect.name, AttendanceRollup.hour)
+    statement = select(bucket, func.sum(AttendanceRollup.check_ins)).where(*rollup_filters(start_date, end_date, class_id, trainer_id)).group_by(bucket).order_by(bucket)
+    return [CheckInsPerIntervalResponse(start=k, check_ins=v) for k, v in (await db.exec(statement)).all()]
+
+#Busiest hours of the day (check-ins per UTC hour of day, same filters as above)
+@router.get("/attendance/hour_of_day", tags=["attendance"], status_code=status.HTTP_200_OK)
+async def get_check_ins_by_hour_of_day(start_date: datetime | None = None, end_date: datetime | None = None, class_id: int | None = None, trainer_id: int | None = None, background: bool = False, db: AsyncSession = Depends(get_read_db)) -> list[CheckInsByHourOfDayResponse]:
+    if background:
+        return await report_jobs.submit(db, "attendance/hour_of_day", get_check_ins_by_hour_of_day, start_date=start_date, end_date=end_date, class_id=class_id, trainer_id=trainer_id)
+    hour_of_day = extract("hour", AttendanceRollup.hour)
+    statement = select(hour_of_day, func.sum(AttendanceRollup.check_ins)).where(*rollup_filters(start_date, end_date, class_id, trainer_id)).group_by(hour_of_day)
+    totals = {int(k): v for k, v in (await db.exec(statement)).all()}
+    return [CheckInsByHourOfDayResponse(hour_of_day=hour, check_ins=totals.get(hour, 0)) for hour in range(24)]
 
 # Active members
 @router.get("/attendance/active_members", tags=["attendance"], status_code=status.HTTP_200_OK)
-async def get_active_members(db: Session = Depends(get_db)):
+async def get_active_members(background: bool = False, db: AsyncSession = Depends(get_read_db)):
     # Returns IDs of members who are active
-    return db.exec(select(Member.id).where(Member.active == True)).all()
+    if background:
+        return await report_jobs.submit(db, "attendance/active_members", get_active_members)
+    return (await db.exec(select(Member.id).where(Member.active == True))).all()
+
+# REPORT JOBS
+@router.get("/jobs/{job_id}", tags=["jobs"], status_code=status.HTTP_200_OK)
+async def get_report_job(job_id: str, wait: float = Query(default=0, ge=0), db: AsyncSession = Depends(get_db)) -> ReportJobResponse:
+    # wait= long-polls: answers as soon as the job finishes, or after that many seconds (at most 30)
+    return await report_jobs.get(db, job_id, wait)
+
+# EXPORT
+# Streams every row (or those changed since a time) as CSV or NDJSON; see exporter.py. The session is the
+# generator's own, as in stream_json, since the response outlives the request.
+@router.get("/export/{entity}", tags=["export"])
+async def export_entity(entity: Literal["members", "trainers", "classes", "attendance"], request: Request, format: Literal["csv", "ndjson"] = "csv", since: datetime | None = None):
+    bind = read_engine(request)
+    statement = exporter.export_statement(entity, since)
+    # For the next incremental export, pass this header back as since
+    headers = {"Content-Disposition": f'attachment; filename="{entity}.{format}"', "X-Export-Next-Since": exporter.next_since().isoformat()}
+
+    async def generate():
+        async with AsyncSession(bind) as session:
+            async for chunk in exporter.export_rows(session, statement, format):
+                yield chunk
+    return StreamingResponse(generate(), media_type=exporter.MEDIA_TYPES[format], headers=headers)
 
 # CREATE
 @router.post("/members", tags=["members"], status_code=status.HTTP_201_CREATED)
-async def create_member(create_member_request: CreateMemberRequest, db: Session = Depends(get_db)) -> int:
+async def create_member(create_member_request: CreateMemberRequest, db: AsyncSession = Depends(get_db)) -> int:
     member: Member = Member(**create_member_request.model_dump())
-    member.id = len(db.exec(select(Member)).all()) + 1
     db.add(member)
-    db.commit()
-    db.refresh(member)
+    await db.commit()
+    await db.refresh(member)
     return member.id
 
 @router.post("/trainers", tags=["trainers"], status_code=status.HTTP_201_CREATED)
-async def create_trainer(create_trainer_request: CreateTrainerRequest, db: Session = Depends(get_db)) -> int:
+async def create_trainer(create_trainer_request: CreateTrainerRequest, db: AsyncSession = Depends(get_db)) -> int:
     trainer: Trainer = Trainer(**create_trainer_request.model_dump())
-    trainer.id = len(db.exec(select(Trainer)).all()) + 1
     db.add(trainer)
-    db.commit()
-    db.refresh(trainer)
+    await db.commit()
+    await db.refresh(trainer)
     return trainer.id
 
 @router.post("/classes", tags=["classes"], status_code=status.HTTP_201_CREATED)
-async def create_class(create_class_request: CreateClassRequest, db: Session = Depends(get_db)) -> int:
+async def create_class(create_class_request: CreateClassRequest, db: AsyncSession = Depends(get_db)) -> int:
     course: Class = Class(**create_class_request.model_dump())
-    course.id = len(db.exec(select(Class)).all()) + 1
-    trainer: Trainer | None = db.get(Trainer, create_class_request.trainer_id)
+    trainer: Trainer | None = await db.get(Trainer, create_class_request.trainer_id)
     if trainer == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Trainer with ID of {create_class_request.trainer_id} not found")
-    course.trainer_id = trainer.id
-    course.trainer = trainer
-    trainer.classes.append(course)
     db.add(course)
-    db.commit()
-    db.refresh(course)
+    await versions.bump(db, Trainer, Trainer.id == trainer.id)
+    await db.commit()
+    response_cache.invalidate(("trainer", create_class_request.trainer_id))
+    await db.refresh(course)
     return course.id
 
+# CREATE: BULK
+async def bulk_insert(db: AsyncSession, model, rows: list[dict]) -> list[int]:
+    # Batched into multi-row INSERT ... RETURNING statements; ids come back in request order
+    if len(rows) == 0:
+        return []
+    ids = (await db.exec(insert(model).returning(model.id, sort_by_parameter_order=True), params=rows)).scalars().all()
+    await db.commit()
+    return list(ids)
+
+@router.post("/members/bulk", tags=["members"], status_code=status.HTTP_201_CREATED)
+async def create_members(create_member_requests: list[CreateMemberRequest], db: AsyncSession = Depends(get_db)) -> list[int]:
+    return await bulk_insert(db, Member, [request.model_dump() for request in create_member_requests])
+
+@router.post("/trainers/bulk", tags=["trainers"], status_code=status.HTTP_201_CREATED)
+async def create_trainers(create_trainer_requests: list[CreateTrainerRequest], db: AsyncSession = Depends(get_db)) -> list[int]:
+    return await bulk_insert(db, Trainer, [request.model_dump() for request in create_trainer_requests])
+
+@router.post("/classes/bulk", tags=["classes"], status_code=status.HTTP_201_CREATED)
+async def create_classes(create_class_requests: list[CreateClassRequest], db: AsyncSession = Depends(get_db)) -> list[int]:
+    trainer_ids = {request.trainer_id for request in create_class_requests}
+    missing_trainer_ids = trainer_ids - set((await db.exec(select(Trainer.id).where(Trainer.id.in_(trainer_ids)))).all())
+    if len(missing_trainer_ids) > 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Trainers with IDs of {sorted(missing_trainer_ids)} not found")
+    await versions.bump(db, Trainer, Trainer.id.in_(trainer_ids))
+    ids = await bulk_insert(db, Class, [request.model_dump() for request in create_class_requests])
+    response_cache.invalidate(*[("trainer", trainer_id) for trainer_id in trainer_ids])
+    return ids
+
+# IMPORT
+# Spooled to memory, then disk, before any row is loaded, so a slow upload never holds a transaction open
+IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+@router.post("/import/{entity}", tags=["import"], status_code=status.HTTP_200_OK)
+async def import_rows(entity: Literal["members", "trainers", "classes", "attendance"], request: Request, format: Literal["csv", "ndjson"] = "csv", job: str | None = None, db: AsyncSession = Depends(get_db)) -> ImportResponse:
+    # The request body is the file itself: CSV with a header row, or one JSON object per line
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as upload:
+        async for chunk in request.stream():
+            upload.write(chunk)
+        upload.seek(0)
+        return ImportResponse(**await importer.import_file(db, entity, upload, format, job))
+
 # POST: CHECK MEMBER INTO CLASS
-@router.post("/attendance/{class_id}/{member_id}", tags=["attendance"], status_code=status.HTTP_201_CREATED)
-async def check_member_into_class(class_id: int, member_id: int, db: Session = Depends(get_db)) -> int:
-    course: Class | None = db.get(Class, class_id)
-    member: Member | None = db.get(Member, member_id)
+@router.post("/attendance/batch", tags=["attendance"], status_code=status.HTTP_200_OK)
+async def check_members_into_classes(check_in_requests: list[CheckInRequest], source: str = Query(default="batch", max_length=32), db: AsyncSession = Depends(get_db)) -> BatchCheckInResponse:
+    pairs = list(dict.fromkeys((request.class_id, request.member_id) for request in check_in_requests))
+    class_ids = set((await db.exec(select(Class.id).where(Class.id.in_({class_id for class_id, _ in pairs})))).all())
+    member_ids = set((await db.exec(select(Member.id).where(Member.id.in_({member_id for _, member_id in pairs})))).all())
+    valid_pairs = [(class_id, member_id) for class_id, member_id in pairs if class_id in class_ids and member_id in member_ids]
+
+    inserted = set()
+    if len(valid_pairs) > 0:
+        checked_in_at = utc_now()
+        statement = upsert(db, Attendance).on_conflict_do_nothing().returning(Attendance.class_id, Attendance.member_id)
+        inserted = {tuple(row) for row in (await db.exec(statement, params=[{"class_id": class_id, "member_id": member_id, "checked_in_at": checked_in_at, "source": source} for class_id, member_id in valid_pairs])).all()}
+        await attendance_summary.record_check_ins(db, [(class_id, checked_in_at) for class_id, _ in inserted])
+        await versions.bump(db, Class, Class.id.in_({class_id for class_id, _ in inserted}))
+        await versions.bump(db, Member, Member.id.in_({member_id for _, member_id in inserted}))
+        await db.commit()
+        response_cache.invalidate(*[("class", class_id) for class_id, _ in inserted], *[("member", member_id) for _, member_id in inserted])
+
+    return BatchCheckInResponse(
+        checked_in=[CheckInRequest(class_id=class_id, member_id=member_id) for class_id, member_id in valid_pairs if (class_id, member_id) in inserted],
+        already_checked_in=[CheckInRequest(class_id=class_id, member_id=member_id) for class_id, member_id in valid_pairs if (class_id, member_id) not in inserted],
+        not_found=[CheckInRequest(class_id=class_id, member_id=member_id) for class_id, member_id in pairs if class_id not in class_ids or member_id not in member_ids],
+    )
 
-    if course == None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not found")
-    
-    if member == None:
+@router.post("/attendance/{class_id}/{member_id}", tags=["attendance"], status_code=status.HTTP_201_CREATED)
+async def check_member_into_class(class_id: int, member_id: int, source: str = Query(default="api", max_length=32), db: AsyncSession = Depends(get_db)) -> int:
+    # One INSERT; the foreign keys stand in for the existence checks and only a failure pays for a lookup
+    try:
+        checked_in_at = utc_now()
+        inserted = (await db.exec(upsert(db, Attendance).values(class_id=class_id, member_id=member_id, checked_in_at=checked_in_at, source=source).on_conflict_do_nothing().returning(Attendance.class_id))).first()
+        if inserted != None:
+            await attendance_summary.record_check_ins(db, [(class_id, checked_in_at)])
+            await versions.bump(db, Class, Class.id == class_id)
+            await versions.bump(db, Member, Member.id == member_id)
+        await db.commit()
+        response_cache.invalidate(("class", class_id), ("member", member_id))
+    except IntegrityError:
+        await db.rollback()
+        if await db.get(Class, class_id) == None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not found")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Member with ID of {member_id} not found")
-    
-    if member in course.members:
-        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Member with ID of {member.id} already in class")
 
-    course.members.append(member)
-    member.classes.append(course)
-    db.commit()
-    db.refresh(member)
-    db.refresh(course)
-    raise HTTPException(status_code=status.HTTP_201_CREATED, detail=f"Member with ID of {member.id} successfully checked into class with ID of {course.id}")
+    if inserted == None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=f"Member with ID of {member_id} already in class")
+
+    raise HTTPException(status_code=status.HTTP_201_CREATED, detail=f"Member with ID of {member_id} successfully checked into class with ID of {class_id}")
 
 # PATCH
 @router.patch("/members/{member_id}", tags=["members"], status_code=status.HTTP_204_NO_CONTENT)
-async def update_member(member_id: int, update_member_request: UpdateMemberRequest, db: Session = Depends(get_db)):
-    member: Member | None = db.get(Member, member_id)
+async def update_member(member_id: int, update_member_request: UpdateMemberRequest, if_match: str | None = Header(default=None), db: AsyncSession = Depends(get_db)):
+    # The row is locked (on Postgres) before the If-Match check, so the check and the write see the same version
+    member: Member | None = await db.get(Member, member_id, with_for_update=True)
     if member == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Member with ID of {member_id} not found")
-    
-    for k, v in update_member_request.model_dump(exclude_unset=True).items():
-        setattr(member, k, v)
+    if if_match != None:
+        versions.check_if_match(if_match, await versions.lookup_member_etag(db, member_id))
 
-    db.commit()
+    await versions.update_checked(db, member, update_member_request.model_dump(exclude_unset=True), if_match)
+    await db.commit()
+    response_cache.invalidate(("member", member_id))
 
 @router.patch("/trainers/{trainer_id}", tags=["trainers"], status_code=status.HTTP_204_NO_CONTENT)
-async def update_trainer(trainer_id: int, update_trainer_request: UpdateTrainerRequest, db: Session = Depends(get_db)):
-    trainer: Trainer | None = db.get(Trainer, trainer_id)
+async def update_trainer(trainer_id: int, update_trainer_request: UpdateTrainerRequest, if_match: str | None = Header(default=None), db: AsyncSession = Depends(get_db)):
+    trainer: Trainer | None = await db.get(Trainer, trainer_id, with_for_update=True)
     
     if trainer == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Trainer with ID of {trainer_id} not found")
-    
-    for k, v in update_trainer_request.model_dump(exclude_unset=True).items():
-        setattr(trainer, k, v)
+    if if_match != None:
+        versions.check_if_match(if_match, await versions.lookup_trainer_etag(db, trainer_id))
 
-    db.commit()
+    await versions.update_checked(db, trainer, update_trainer_request.model_dump(exclude_unset=True), if_match)
+    await db.commit()
+    response_cache.invalidate(("trainer", trainer_id))
 
 @router.patch("/classes/{class_id}", tags=["classes"], status_code=status.HTTP_204_NO_CONTENT)
-async def update_class(class_id: int, update_class_request: UpdateClassRequest, db: Session = Depends(get_db)):
-    course: Class | None = db.get(Class, class_id)
+async def update_class(class_id: int, update_class_request: UpdateClassRequest, if_match: str | None = Header(default=None), db: AsyncSession = Depends(get_db)):
+    course: Class | None = await db.get(Class, class_id, with_for_update=True)
 
     if course == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not found")
+    if if_match != None:
+        versions.check_if_match(if_match, await versions.lookup_class_etag(db, class_id))
 
-    if update_class_request.trainer_id != None:
-        trainer: Trainer | None = db.get(Trainer, update_class_request.trainer_id)
+    # An explicit null detaches the class from its trainer, so go by what was sent rather than by the value
+    moved = "trainer_id" in update_class_request.model_fields_set and update_class_request.trainer_id != course.trainer_id
+    if moved and update_class_request.trainer_id != None:
+        trainer: Trainer | None = await db.get(Trainer, update_class_request.trainer_id)
         if trainer == None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Trainer with ID of {update_class_request.trainer_id} not found")
-        course.trainer = trainer
 
-    for k, v in update_class_request.model_dump(exclude_unset=True).items():
-        setattr(course, k, v)
+    moved_between = {course.trainer_id, update_class_request.trainer_id} - {None} if moved else set()
+    await versions.update_checked(db, course, update_class_request.model_dump(exclude_unset=True), if_match)
+    if moved:
+        await attendance_summary.move_class(db, class_id, update_class_request.trainer_id)
+        # Moving a class changes which classes both trainers list
+        await versions.bump(db, Trainer, Trainer.id.in_(moved_between))
 
-    db.commit()
+    await db.commit()
+    # Both trainers' versions were bumped, so their cached responses go even when they don't embed the class
+    response_cache.invalidate(("class", class_id), *[("trainer", trainer_id) for trainer_id in moved_between])
 
 # DELETE
-@router.delete("/members/{member_id}", tags=["members"], status_code=status.HTTP_204_NO_CONTENT)
-async def delete_member(member_id, db: Session = Depends(get_db)):
-    member: Member | None = db.get(Member, member_id)
+# One DELETE per request: the foreign keys take attendance, summary and rollup rows with a deleted class or
+# member, and leave a deleted trainer's classes without one (models.py). Only the counters for a deleted
+# member's check-ins and the versions of whatever embedded the deleted rows are updated first. Both return
+# the deleted ids, and the cache entries to invalidate after the commit: the deleted rows' and the bumped ones'.
+async def delete_members_where(db: AsyncSession, where: list) -> tuple[list[int], list[tuple]]:
+    members = select(Member.id).where(*where)
+    await attendance_summary.record_member_removals(db, members)
+    class_ids = await versions.bump_returning_ids(db, Class, Class.id.in_(select(Attendance.class_id).where(Attendance.member_id.in_(members))))
+    member_ids = (await db.exec(delete(Member).where(*where).returning(Member.id))).scalars().all()
+    return member_ids, [("member", member_id) for member_id in member_ids] + [("class", class_id) for class_id in class_ids]
+
+async def delete_classes_where(db: AsyncSession, where: list) -> tuple[list[int], list[tuple]]:
+    member_ids = await versions.bump_returning_ids(db, Member, Member.id.in_(select(Attendance.member_id).where(Attendance.class_id.in_(select(Class.id).where(*where)))))
+    deleted = (await db.exec(delete(Class).where(*where).returning(Class.id, Class.trainer_id))).all()
+    trainer_ids = await versions.bump_returning_ids(db, Trainer, Trainer.id.in_({trainer_id for _, trainer_id in deleted if trainer_id != None}))
+    class_ids = [class_id for class_id, _ in deleted]
+    return class_ids, [("class", class_id) for class_id in class_ids] + [("member", member_id) for member_id in member_ids] + [("trainer", trainer_id) for trainer_id in trainer_ids]
 
-    if member == None:
+@router.delete("/members/{member_id}", tags=["members"], status_code=status.HTTP_204_NO_CONTENT)
+async def delete_member(member_id: int, db: AsyncSession = Depends(get_db)):
+    member_ids, changed = await delete_members_where(db, [Member.id == member_id])
+    if len(member_ids) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Member with ID of {member_id} not found")
-    db.delete(member)
-    db.commit()
+    await db.commit()
+    response_cache.invalidate(*changed)
 
 @router.delete("/trainers/{trainer_id}", tags=["trainers"], status_code=status.HTTP_204_NO_CONTENT)
-async def delete_trainer(trainer_id, db: Session = Depends(get_db)):
-    trainer: Trainer | None = db.get(Trainer, trainer_id)
-
-    if trainer == None:
+async def delete_trainer(trainer_id: int, db: AsyncSession = Depends(get_db)):
+    # The classes lose their trainer_id, which members' expanded classes show too
+    class_ids = await versions.bump_returning_ids(db, Class, Class.trainer_id == trainer_id)
+    if (await db.exec(delete(Trainer).where(Trainer.id == trainer_id).returning(Trainer.id))).scalar() == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Trainer with ID of {trainer_id} not found")
-    db.delete(trainer)
-    db.commit()
+    await db.commit()
+    response_cache.invalidate(("trainer", trainer_id), *[("class", class_id) for class_id in class_ids])
 
 @router.delete("/classes/{class_id}", tags=["classes"], status_code=status.HTTP_204_NO_CONTENT)
-async def delete_class(class_id: int, db: Session = Depends(get_db)):
-    course: Class | None = db.get(Class, class_id)
-
-    if course == None:
+async def delete_class(class_id: int, db: AsyncSession = Depends(get_db)):
+    class_ids, changed = await delete_classes_where(db, [Class.id == class_id])
+    if len(class_ids) == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not found")
-    db.delete(course)
-    db.commit()
+    await db.commit()
+    response_cache.invalidate(*changed)
+
+# DELETE: BY FILTER
+# Same filters as the list routes (e.g. DELETE /classes?end_date=2025-01-01T00:00:00 for every class before
+# 2025), at least one of them required
+@router.delete("/members", tags=["members"], status_code=status.HTTP_200_OK)
+async def delete_members(name: str | None = None, search: str | None = None, active: bool | None = None, class_id: int | None = None, db: AsyncSession = Depends(get_db)) -> BulkDeleteResponse:
+    where = filters.member_filters(db, name, search, active, class_id)
+    if len(where) == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Give at least one filter to delete members by")
+    member_ids, changed = await delete_members_where(db, where)
+    await db.commit()
+    response_cache.invalidate(*changed)
+    return BulkDeleteResponse(deleted=len(member_ids))
+
+@router.delete("/classes", tags=["classes"], status_code=status.HTTP_200_OK)
+async def delete_classes(name: str | None = None, search: str | None = None, trainer_id: int | None = None, start_date: NaiveDatetime | None = None, end_date: NaiveDatetime | None = None, db: AsyncSession = Depends(get_db)) -> BulkDeleteResponse:
+    where = filters.class_filters(db, name, search, trainer_id, start_date, end_date)
+    if len(where) == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Give at least one filter to delete classes by")
+    class_ids, changed = await delete_classes_where(db, where)
+    await db.commit()
+    response_cache.invalidate(*changed)
+    return BulkDeleteResponse(deleted=len(class_ids))
 
 # DELETE: Member from Class
 @router.delete("/classes/{class_id}/{member_id}", tags=["classes"], status_code=status.HTTP_204_NO_CONTENT)
-async def delete_member_from_class(class_id: int, member_id: int, db: Session = Depends(get_db)):
-    course: Class | None = db.get(Class, class_id)
-    member: Member | None = db.get(Member, member_id)
+async def delete_member_from_class(class_id: int, member_id: int, db: AsyncSession = Depends(get_db)):
+    course: Class | None = await db.get(Class, class_id)
+    member: Member | None = await db.get(Member, member_id)
 
     if course == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not found")
     if member == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Member with ID of {member_id} not found")
-    if member not in course.members:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Member with ID of {member_id} not in class")
 
-    course.members.remove(member)
-    db.commit()
+    checked_in_at = (await db.exec(delete(Attendance).where(Attendance.class_id == class_id, Attendance.member_id == member_id).returning(Attendance.checked_in_at))).scalar()
+    if checked_in_at == None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Member with ID of {member_id} not in class")
+    await attendance_summary.record_removal(db, class_id, checked_in_at)
+    await versions.bump(db, Class, Class.id == class_id)
+    await versions.bump(db, Member, Member.id == member_id)
+    await db.commit()
+    response_cache.invalidate(("class", class_id), ("member", member_id))
 
     raise HTTPException(status_code=status.HTTP_204_NO_CONTENT)
 
 
 # DELETE: Class from Member classes list
 @router.delete("/members/{member_id}/{class_id}", tags=["members"], status_code=status.HTTP_204_NO_CONTENT)
-async def delete_class_from_member(member_id: int, class_id: int, db: Session = Depends(get_db)):
-    member: Member | None = db.get(Member, member_id)
-    course: Class | None = db.get(Class, class_id)
+async def delete_class_from_member(member_id: int, class_id: int, db: AsyncSession = Depends(get_db)):
+    member: Member | None = await db.get(Member, member_id)
+    course: Class | None = await db.get(Class, class_id)
 
     if member == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Member with ID of {member_id} not found")
     if course == None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not found")
-    if course not in member.classes:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not in member's classes list")
 
-    member.classes.remove(course)
-    db.commit()
+    checked_in_at = (await db.exec(delete(Attendance).where(Attendance.class_id == class_id, Attendance.member_id == member_id).returning(Attendance.checked_in_at))).scalar()
+    if checked_in_at == None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Class with ID of {class_id} not in member's classes list")
+    await attendance_summary.record_removal(db, class_id, checked_in_at)
+    await versions.bump(db, Class, Class.id == class_id)
+    await versions.bump(db, Member, Member.id == member_id)
+    await db.commit()
+    response_cache.invalidate(("class", class_id), ("member", member_id))
     
 
+# METRICS
+@router.get("/metrics", tags=["metrics"], status_code=status.HTTP_200_OK)
+async def get_metrics():
+    # Prometheus text format: per-route latency, query count, SQL time, rows fetched and response size
+    body, content_type = metrics_text()
+    return Response(content=body, media_type=content_type)
+
+@router.get("/metrics/pool", tags=["metrics"], status_code=status.HTTP_200_OK)
+async def get_pool_metrics() -> PoolMetricsResponse:
+    return PoolMetricsResponse(**pool_metrics())
+
+@router.get("/metrics/cache", tags=["metrics"], status_code=status.HTTP_200_OK)
+async def get_cache_metrics() -> CacheMetricsResponse:
+    return CacheMetricsResponse(**response_cache.stats())
+
 app.include_router(router)
\ No newline at end of file
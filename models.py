@@ -1,32 +1,105 @@
+from datetime import datetime, timezone
+
+from pydantic import NaiveDatetime
+from sqlalchemy import Index, func, text
 from sqlmodel import Field, Relationship, SQLModel
 
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def as_utc(moment: datetime) -> datetime:
+    # For comparing with the naive UTC columns: an offset is converted to UTC, a naive value is taken as UTC already
+    return moment.astimezone(timezone.utc).replace(tzinfo=None) if moment.tzinfo != None else moment
+
+def updated_at_field():
+    # Stamped on insert and on every UPDATE, versions.bump included, so it moves whenever version does;
+    # the incremental exports (exporter.py) select on it
+    return Field(default_factory=utc_now, index=True, sa_column_kwargs={"default": utc_now, "onupdate": utc_now, "server_default": func.now()})
+
+# Deletes are left to the foreign keys: a class or member takes its attendance (and a class its summary
+# and rollup rows) with it, and a trainer's classes and rollup rows are kept without a trainer.
+# passive_deletes stops the ORM loading those collections to do it itself.
+
 # Attendance linking table
 class Attendance(SQLModel, table=True):
-    class_id: int | None = Field(foreign_key="class.id", primary_key=True)
-    member_id: int | None = Field(foreign_key="member.id", primary_key=True)
+    class_id: int | None = Field(foreign_key="class.id", ondelete="CASCADE", primary_key=True)
+    member_id: int | None = Field(foreign_key="member.id", ondelete="CASCADE", primary_key=True, index=True)
+    # When and through what (api, batch, import, or a client-supplied name) the member checked in
+    checked_in_at: NaiveDatetime = Field(default_factory=utc_now, sa_column_kwargs={"default": utc_now, "server_default": func.now()})
+    source: str = Field(default="api", sa_column_kwargs={"server_default": "api"})
 
 # Member
 class Member(SQLModel, table=True):
-    id: int | None = Field(primary_key=True)
+    # Partial index: only the active members, which is what get_active_members reads
+    __table_args__ = (Index("ix_member_active", "id", postgresql_where=text("active"), sqlite_where=text("active = 1")),)
+    id: int | None = Field(default=None, primary_key=True)
     name: str
-    classes: list["Class"] = Relationship(back_populates="members", link_model=Attendance)
+    classes: list["Class"] = Relationship(back_populates="members", link_model=Attendance, passive_deletes=True)
     active: bool = True
+    version: int = 1
+    updated_at: NaiveDatetime = updated_at_field()
+
+# Case-insensitive name search (filters.py); text_pattern_ops lets Postgres use it for LIKE 'prefix%'
+Index("ix_member_name_lower", func.lower(Member.name).label("name_lower"), postgresql_ops={"name_lower": "text_pattern_ops"})
 
 # Trainer
 class Trainer(SQLModel, table=True):
-    id: int | None = Field(primary_key=True)
+    id: int | None = Field(default=None, primary_key=True)
     name: str
     specialty: str
-    classes: list["Class"] = Relationship(back_populates="trainer")
+    classes: list["Class"] = Relationship(back_populates="trainer", passive_deletes=True)
+    version: int = 1
+    updated_at: NaiveDatetime = updated_at_field()
 
 # Class
 class Class(SQLModel, table=True):
-    id: int | None = Field(primary_key=True)
+    id: int | None = Field(default=None, primary_key=True)
     name: str
-    trainer_id: int | None = Field(foreign_key="trainer.id")
+    trainer_id: int | None = Field(foreign_key="trainer.id", ondelete="SET NULL", index=True)
     trainer: Trainer | None = Relationship(back_populates="classes")
-    members: list[Member] = Relationship(back_populates="classes", link_model=Attendance)
-    date: str
+    members: list[Member] = Relationship(back_populates="classes", link_model=Attendance, passive_deletes=True)
+    date: NaiveDatetime = Field(index=True)
     duration: int
+    version: int = 1
+    updated_at: NaiveDatetime = updated_at_field()
+
+Index("ix_class_name_lower", func.lower(Class.name).label("name_lower"), postgresql_ops={"name_lower": "text_pattern_ops"})
+
+# Attendance summary (per-class attendance totals, kept in step with Attendance)
+class AttendanceSummary(SQLModel, table=True):
+    __tablename__ = "attendance_summary"
+    class_id: int = Field(foreign_key="class.id", ondelete="CASCADE", primary_key=True)
+    attendance_total: int = 0
+
+# Attendance rollup (check-ins per class per UTC hour, kept in step with Attendance like the summary).
+# A class has one trainer, so trainer_id is carried alongside rather than keyed on, for the trainer reports.
+class AttendanceRollup(SQLModel, table=True):
+    __tablename__ = "attendance_rollup"
+    __table_args__ = (Index("ix_attendance_rollup_trainer_id_hour", "trainer_id", "hour"),)
+    hour: NaiveDatetime = Field(primary_key=True)
+    class_id: int = Field(foreign_key="class.id", ondelete="CASCADE", primary_key=True, index=True)
+    trainer_id: int | None = Field(default=None, foreign_key="trainer.id", ondelete="SET NULL")
+    check_ins: int = 0
 
+# Import progress (how far a named import has got, committed with each chunk so a rerun resumes after it)
+class ImportJob(SQLModel, table=True):
+    __tablename__ = "import_job"
+    name: str = Field(primary_key=True)
+    entity: str
+    rows_done: int = 0
+    imported: int = 0
+    failed: int = 0
 
+# Background report jobs (jobs.py): what ran, with which parameters, and the stored result
+class ReportJob(SQLModel, table=True):
+    __tablename__ = "report_job"
+    __table_args__ = (Index("ix_report_job_report_params", "report", "params"),)
+    id: str = Field(primary_key=True)
+    report: str
+    params: str
+    status: str = "queued"
+    result: str | None = None
+    error: str | None = None
+    created_at: NaiveDatetime = Field(default_factory=utc_now)
+    started_at: NaiveDatetime | None = None
+    finished_at: NaiveDatetime | None = Field(default=None, index=True)
@@ -1,4 +1,6 @@
-from pydantic import BaseModel
+from datetime import datetime
+
+from pydantic import BaseModel, Field, NaiveDatetime
 # from models import Member, Trainer, Class 
 
 # GET
@@ -6,7 +8,7 @@ from pydantic import BaseModel
 class GetMemberResponse(BaseModel):
     id: int
     name: str
-    classes: list["ClassResponse"]
+    classes: list["ClassResponse"] | None = None  # ?expand=classes
     active: bool
 
 # GET TRAINER RESPONSE
@@ -14,23 +16,39 @@ class GetTrainerResponse(BaseModel):
     id: int
     name: str
     specialty: str
-    classes: list["GetClassResponse"]
+    classes: list["GetClassResponse"] | None = None  # ?expand=classes, and classes.members for their members
 
 # GET CLASS RESPONSE
 class GetClassResponse(BaseModel):
     id: int
     name: str
-    trainer_id: int
-    trainer: str
-    date: str
-    members: list[str]
+    trainer_id: int | None  # None once the trainer is deleted
+    trainer: str | None
+    date: datetime
+    members: list[str] | None = None  # ?expand=members
     duration: int
 
+# GET MANY BY ID
+class LookupRequest(BaseModel):
+    ids: list[int]
+
+class MemberBatchResponse(BaseModel):
+    items: list[GetMemberResponse]
+    missing: list[int]
+
+class TrainerBatchResponse(BaseModel):
+    items: list[GetTrainerResponse]
+    missing: list[int]
+
+class ClassBatchResponse(BaseModel):
+    items: list[GetClassResponse]
+    missing: list[int]
+
 # SIMPLE CLASS RESPONSE
 class ClassResponse(BaseModel):
     name: str
-    trainer_id: int
-    date: str
+    trainer_id: int | None
+    date: datetime
     duration: int
 
 # GET ATTENDANCE PER CLASS
@@ -43,6 +61,98 @@ class AttendancePerTrainerResponse(BaseModel):
     trainer_id: int
     attendance_total: int | None = 0
 
+# GET TRAINER LEADERBOARD
+class TrainerLeaderboardResponse(BaseModel):
+    trainer_id: int
+    name: str
+    attendance_total: int
+    distinct_members: int
+    class_count: int
+    average_class_fill: float
+    rank: int
+    percentile: float
+
+# GET ATTENDANCE BY DAY OF WEEK
+class AttendanceByDayOfWeekResponse(BaseModel):
+    day_of_week: str
+    attendance_total: int
+
+# GET CHECK-INS PER HOUR OR DAY
+class CheckInsPerIntervalResponse(BaseModel):
+    start: datetime
+    check_ins: int
+
+# GET CHECK-INS BY HOUR OF DAY
+class CheckInsByHourOfDayResponse(BaseModel):
+    hour_of_day: int
+    check_ins: int
+
+# ATTENDANCE SUMMARY DRIFT
+class AttendanceDriftResponse(BaseModel):
+    class_id: int
+    recorded_total: int
+    actual_total: int
+    # attendance_rollup rows for the class that were missing, left over, or had the wrong count or trainer
+    rollup_rows_drifted: int
+
+# BATCH CHECK IN RESPONSE
+class BatchCheckInResponse(BaseModel):
+    checked_in: list["CheckInRequest"]
+    already_checked_in: list["CheckInRequest"]
+    not_found: list["CheckInRequest"]
+
+# GET POOL METRICS
+class PoolMetricsResponse(BaseModel):
+    pool_size: int
+    checked_in: int
+    checked_out: int
+    overflow: int
+    max_overflow: int
+    checkouts_total: int
+    checkout_wait_seconds_total: float
+    checkout_wait_seconds_max: float
+    queries_total: int
+    query_seconds_total: float
+
+# GET CACHE METRICS
+class CacheMetricsResponse(BaseModel):
+    entries: int
+    max_entries: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    invalidations: int
+    stale_fills: int
+
+
+# REPORT JOB
+class ReportJobResponse(BaseModel):
+    id: str
+    report: str
+    params: dict
+    status: str  # queued, running, done or failed
+    created_at: datetime
+    started_at: datetime | None
+    finished_at: datetime | None
+    error: str | None
+    result: list | dict | None  # the report's response, once done
+
+# IMPORT
+class ImportRowError(BaseModel):
+    row: int
+    errors: list[str]
+
+class ImportResponse(BaseModel):
+    entity: str
+    job: str | None
+    resumed_from: int
+    rows: int
+    imported: int
+    already_present: int
+    failed: int
+    errors: list[ImportRowError]
 
 
 # CREATE
@@ -57,9 +167,19 @@ class CreateTrainerRequest(BaseModel):
 class CreateClassRequest(BaseModel):
     name: str
     trainer_id: int
-    date: str
+    date: NaiveDatetime
     duration: int
 
+# CHECK IN
+class CheckInRequest(BaseModel):
+    class_id: int
+    member_id: int
+
+# Imported history can say when and how each check-in happened
+class ImportCheckInRequest(CheckInRequest):
+    checked_in_at: NaiveDatetime | None = None
+    source: str = Field(default="import", max_length=32)
+
 # UPDATE
 class UpdateMemberRequest(BaseModel):
     name: str | None = None
@@ -72,9 +192,13 @@ class UpdateTrainerRequest(BaseModel):
 class UpdateClassRequest(BaseModel):
     name: str | None = None
     trainer_id: int | None = None
-    date: str | None = None
+    date: NaiveDatetime | None = None
     duration: int | None = None
 
+# DELETE
+class BulkDeleteResponse(BaseModel):
+    deleted: int
+
     
 
 
@@ -0,0 +1,36 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+import pytest
+
+# database.py reads its URLs on import, so they're set before anything imports the app. The databases are
+# SQLite files of this session's own; nothing copies the primary to the replica, so a test can tell which
+# one answered by changing a row on one side
+DATA_DIR = tempfile.mkdtemp(prefix="fantastic-fitness-tests-")
+atexit.register(shutil.rmtree, DATA_DIR, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{DATA_DIR}/primary.db"
+os.environ["REPLICA_DATABASE_URL"] = f"sqlite:///{DATA_DIR}/replica.db"
+
+from fastapi.testclient import TestClient
+
+import database
+import main
+from benchmarks.data import seed
+
+
+@pytest.fixture
+def seed_databases():
+    # Replaces whatever every database the app reads holds with the same synthetic gym (see benchmarks.data)
+    def fill(members: int, trainers: int, classes: int, per_class: int):
+        for url in dict.fromkeys([database.DATABASE_URL, database.REPLICA_DATABASE_URL or database.DATABASE_URL]):
+            seed(url, members, trainers, classes, per_class)
+    return fill
+
+
+@pytest.fixture
+def client():
+    # Runs the app's lifespan too, so the pools are warm and the report workers are up
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def gym(seed_databases):
+    seed_databases(members=20, trainers=2, classes=10, per_class=3)
+
+
+@pytest.mark.parametrize("path", ["/attendance/day_of_week", "/attendance/trainers"])
+def test_class_date_windows_refuse_an_offset(client, path):
+    assert client.get(f"{path}?start_date=2025-01-01T00:00:00").status_code == 200
+    for start in ["2025-01-01T00:00:00Z", "2025-01-01T00:00:00%2B05:00"]:
+        assert client.get(f"{path}?start_date={start}").status_code == 422, start
+
+
+@pytest.mark.parametrize("path", ["/attendance/check_ins", "/attendance/hour_of_day"])
+def test_check_in_windows_convert_an_offset_to_utc(client, path):
+    # Check-ins are stored in UTC, so the same instant with or without an offset selects the same hours
+    utc = client.get(f"{path}?start_date=2025-03-01T00:00:00&end_date=2025-09-01T00:00:00")
+    offset = client.get(f"{path}?start_date=2025-03-01T05:00:00%2B05:00&end_date=2025-08-31T19:00:00-05:00")
+    assert utc.status_code == offset.status_code == 200
+    assert len(utc.json()) > 0
+    assert offset.json() == utc.json()
+
+
+def test_class_filters_refuse_an_offset(client):
+    assert client.get("/classes?start_date=2025-01-01T00:00:00Z").status_code == 422
+    assert client.delete("/classes?end_date=2026-01-01T00:00:00%2B05:00").status_code == 422
+    assert len(client.get("/classes").json()) == 10
+    assert client.delete("/classes?end_date=2026-01-01T00:00:00").json() == {"deleted": 10}
@@ -0,0 +1,37 @@
+import pytest
+
+from benchmarks.data import attendee
+
+MEMBERS, PER_CLASS = 20, 3
+
+
+@pytest.fixture(autouse=True)
+def gym(seed_databases):
+    seed_databases(members=MEMBERS, trainers=2, classes=5, per_class=PER_CLASS)
+
+
+def assert_changed(client, path: str, etag: str, patch: dict):
+    # A delete that bumped the row must drop its cached response, or the old ETag is served and a PATCH
+    # with the new one would be refused
+    current = client.get(path).headers["etag"]
+    assert current != etag, path
+    assert client.patch(path, json=patch, headers={"If-Match": current}).status_code == 204, path
+
+
+@pytest.mark.parametrize("path", ["/members/{}", "/members?name=Member {}"])
+def test_deleting_members_invalidates_their_classes(client, path):
+    member_id = attendee(1, 0, MEMBERS, PER_CLASS)
+    etag = client.get("/classes/1").headers["etag"]
+    assert client.delete(path.format(member_id)).status_code in (200, 204)
+    assert_changed(client, "/classes/1", etag, {"duration": 15})
+
+
+@pytest.mark.parametrize("path", ["/classes/{}", "/classes?name=Class {}"])
+def test_deleting_classes_invalidates_their_members_and_trainer(client, path):
+    member_id = attendee(2, 0, MEMBERS, PER_CLASS)
+    trainer_id = client.get("/classes/2").json()["trainer_id"]
+    member_etag = client.get(f"/members/{member_id}").headers["etag"]
+    trainer_etag = client.get(f"/trainers/{trainer_id}").headers["etag"]
+    assert client.delete(path.format(2)).status_code in (200, 204)
+    assert_changed(client, f"/members/{member_id}", member_etag, {"name": "Still here"})
+    assert_changed(client, f"/trainers/{trainer_id}", trainer_etag, {"specialty": "Spin"})
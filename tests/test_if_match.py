@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import versions
+from database import DATABASE_URL, create_engine
+from models import Member
+
+
+@pytest.fixture(autouse=True)
+def gym(seed_databases):
+    seed_databases(members=5, trainers=1, classes=2, per_class=2)
+
+
+def test_a_patch_with_a_used_etag_gets_412(client):
+    etag = client.get("/members/1").headers["etag"]
+    assert client.patch("/members/1", json={"name": "First"}, headers={"If-Match": etag}).status_code == 204
+    assert client.patch("/members/1", json={"name": "Second"}, headers={"If-Match": etag}).status_code == 412
+    current = client.get("/members/1")
+    assert current.json()["name"] == "First"
+    assert client.patch("/members/1", json={"name": "Weak"}, headers={"If-Match": "W/" + current.headers["etag"]}).status_code == 412
+    assert client.patch("/members/1", json={"name": "Third"}, headers={"If-Match": current.headers["etag"]}).status_code == 204
+
+
+def test_a_failed_class_patch_doesnt_move_the_class(client):
+    etag = client.get("/classes/1").headers["etag"]
+    assert client.patch("/classes/1", json={"duration": 15}, headers={"If-Match": etag}).status_code == 204
+    assert client.patch("/classes/1", json={"trainer_id": None}, headers={"If-Match": etag}).status_code == 412
+    assert client.get("/classes/1").json()["trainer_id"] == 1
+    assert client.post("/attendance/reconcile").json() == []
+
+
+def test_racing_patches_with_the_same_etag_apply_once():
+    # Both requests load version 1 before either writes, as they can on SQLite, which has no row locks
+    async def race() -> tuple[int, str]:
+        engine = create_engine(DATABASE_URL)
+        try:
+            async with AsyncSession(engine) as first, AsyncSession(engine) as second:
+                first_member = await first.get(Member, 1, with_for_update=True)
+                second_member = await second.get(Member, 1, with_for_update=True)
+                await versions.update_checked(first, first_member, {"name": "First"}, '"m-1-1"')
+                await first.commit()
+                with pytest.raises(HTTPException) as error:
+                    await versions.update_checked(second, second_member, {"name": "Second"}, '"m-1-1"')
+                await second.rollback()
+                return error.value.status_code, (await second.exec(select(Member.name).where(Member.id == 1))).one()
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(race()) == (412, "First")
@@ -0,0 +1,36 @@
+import pytest
+
+from database import pool_stats
+
+# SQL statements per list request: one for the rows, plus one per level of ?expand=. They must stay the same
+# however many rows there are, so no relationship is loaded per row
+QUERIES_PER_REQUEST = {
+    "/members": 1,
+    "/trainers": 1,
+    "/classes": 1,
+    "/members?expand=classes": 2,
+    "/trainers?expand=classes": 2,
+    "/trainers?expand=classes.members": 3,
+    "/classes?expand=members": 2,
+    "/members?stream=true&expand=classes": 2,
+}
+
+
+@pytest.mark.parametrize("scale", [1, 4])
+def test_list_routes_run_a_fixed_number_of_statements(seed_databases, client, scale):
+    seed_databases(members=50 * scale, trainers=5 * scale, classes=20 * scale, per_class=5)
+    for path, expected in QUERIES_PER_REQUEST.items():
+        before = pool_stats.queries
+        response = client.get(path)
+        assert response.status_code == 200, path
+        assert pool_stats.queries - before == expected, path
+
+
+@pytest.mark.parametrize("scale", [1, 4])
+def test_list_routes_return_every_row(seed_databases, client, scale):
+    seed_databases(members=50 * scale, trainers=5 * scale, classes=20 * scale, per_class=5)
+    assert len(client.get("/members").json()) == 50 * scale
+    assert len(client.get("/trainers").json()) == 5 * scale
+    classes = client.get("/classes?expand=members").json()
+    assert len(classes) == 20 * scale
+    assert all(len(course["members"]) == 5 for course in classes)
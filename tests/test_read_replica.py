@@ -0,0 +1,79 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine, update
+
+from cache import ResponseCache, response_cache
+from database import PRIMARY_COOKIE, REPLICA_DATABASE_URL
+from models import Member
+
+
+@pytest.fixture(autouse=True)
+def gym(seed_databases):
+    seed_databases(members=20, trainers=2, classes=5, per_class=3)
+
+
+def rename_on_replica(member_id: int, name: str):
+    engine = create_engine(REPLICA_DATABASE_URL)
+    with engine.begin() as connection:
+        connection.execute(update(Member).where(Member.id == member_id).values(name=name))
+    engine.dispose()
+
+
+def member_name(client, member_id: int) -> str:
+    # ?ids= isn't cached, so this always reads whichever database the client is sent to
+    return client.get(f"/members?ids={member_id}").json()["items"][0]["name"]
+
+
+def test_reads_without_the_cookie_go_to_the_replica(client):
+    rename_on_replica(1, "On the replica")
+    assert member_name(client, 1) == "On the replica"
+    assert client.get("/members?name=On the replica").json()[0]["id"] == 1
+
+
+def test_a_write_sends_that_clients_reads_to_the_primary(client):
+    response = client.patch("/members/2", json={"name": "Renamed"})
+    assert response.status_code == 204
+    assert float(response.cookies[PRIMARY_COOKIE]) > time.time()
+    assert member_name(client, 2) == "Renamed"
+    # Any other client still reads the replica, which never saw the write
+    client.cookies.clear()
+    assert member_name(client, 2) == "Member 2"
+
+
+def test_a_failed_write_doesnt_set_the_cookie(client):
+    response = client.patch("/members/999", json={"name": "Nobody"})
+    assert response.status_code == 404
+    assert PRIMARY_COOKIE not in response.cookies
+
+
+def test_lookup_doesnt_set_the_cookie(client):
+    rename_on_replica(3, "On the replica")
+    response = client.post("/members/lookup", json={"ids": [3]})
+    assert response.status_code == 200
+    assert PRIMARY_COOKIE not in response.cookies
+    assert response.json()["items"][0]["name"] == "On the replica"
+    assert member_name(client, 3) == "On the replica"
+
+
+def test_a_replica_read_from_before_a_write_isnt_cached(client):
+    client.patch("/members/4", json={"name": "Renamed"})
+    client.cookies.clear()
+    stale_fills = response_cache.stale_fills
+    # The replica may be behind the write, so its answer is served but not cached over the invalidation
+    assert client.get("/members/4").json()["name"] == "Member 4"
+    assert response_cache.stale_fills == stale_fills + 1
+    assert response_cache.get(("member", 4)) == None
+
+
+def test_set_refuses_a_fill_read_before_an_invalidation():
+    cache = ResponseCache(max_entries=10, ttl_seconds=30, invalidation_window=60)
+    read_at = time.monotonic()
+    cache.invalidate(("trainer", 1))
+    cache.set(("class", 1), (b"{}", '"c-1-1-1"'), [("trainer", 1)], read_at)
+    assert cache.stale_fills == 1
+    assert cache.get(("class", 1)) == None
+    # A read that began after the invalidation is fine
+    cache.set(("class", 1), (b"{}", '"c-1-1-2"'), [("trainer", 1)], time.monotonic())
+    assert cache.stale_fills == 1
+    assert cache.get(("class", 1)) == (b"{}", '"c-1-1-2"')
@@ -0,0 +1,106 @@
+from fastapi import HTTPException, status
+from sqlalchemy import func, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from models import Attendance, Class, Member, Trainer
+
+# ETags are built from row versions. A version only ever goes up, and every change to *which* rows a
+# payload embeds bumps the owning row, so summing the embedded rows' versions is enough to notice any
+# change to them. Relationships only count when ?expand= embeds them:
+#   member  = member.version [, sum of its classes' versions]
+#   class   = class.version, trainer.version [, sum of its members' versions]
+#   trainer = trainer.version [, sum of its classes' versions [, sum of those classes' members' versions]]
+# So the unexpanded ETag is a prefix of every expanded one.
+
+def etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+def parse_tags(header: str) -> list[str]:
+    return [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+def etag_matches(header: str | None, current: str) -> bool:
+    if header == None:
+        return False
+    tags = parse_tags(header)
+    return "*" in tags or current in tags
+
+# ETags from already loaded objects; only the expanded relationships need to be loaded
+def member_etag(member: Member, expand: frozenset[str] = frozenset()) -> str:
+    parts = [member.version]
+    if "classes" in expand:
+        parts.append(sum(course.version for course in member.classes))
+    return etag("m", member.id, *parts)
+
+def class_etag(course: Class, expand: frozenset[str] = frozenset()) -> str:
+    parts = [course.version, course.trainer.version if course.trainer != None else 0]
+    if "members" in expand:
+        parts.append(sum(member.version for member in course.members))
+    return etag("c", course.id, *parts)
+
+def trainer_etag(trainer: Trainer, expand: frozenset[str] = frozenset()) -> str:
+    parts = [trainer.version]
+    if "classes" in expand:
+        parts.append(sum(course.version for course in trainer.classes))
+    if "classes.members" in expand:
+        parts.append(sum(member.version for course in trainer.classes for member in course.members))
+    return etag("t", trainer.id, *parts)
+
+# ETags from aggregate queries, without loading relationships; None when the row doesn't exist
+async def lookup_member_etag(db: AsyncSession, member_id: int, expand: frozenset[str] = frozenset()) -> str | None:
+    if "classes" not in expand:
+        version = (await db.exec(select(Member.version).where(Member.id == member_id))).first()
+        return etag("m", member_id, version) if version != None else None
+    row = (await db.exec(select(Member.version, func.coalesce(func.sum(Class.version), 0)).outerjoin(Attendance, Attendance.member_id == Member.id).outerjoin(Class, Class.id == Attendance.class_id).where(Member.id == member_id).group_by(Member.id, Member.version))).first()
+    return etag("m", member_id, *row) if row != None else None
+
+async def lookup_class_etag(db: AsyncSession, class_id: int, expand: frozenset[str] = frozenset()) -> str | None:
+    if "members" not in expand:
+        row = (await db.exec(select(Class.version, func.coalesce(Trainer.version, 0)).outerjoin(Trainer, Trainer.id == Class.trainer_id).where(Class.id == class_id))).first()
+        return etag("c", class_id, *row) if row != None else None
+    row = (await db.exec(select(Class.version, func.coalesce(func.max(Trainer.version), 0), func.coalesce(func.sum(Member.version), 0)).outerjoin(Trainer, Trainer.id == Class.trainer_id).outerjoin(Attendance, Attendance.class_id == Class.id).outerjoin(Member, Member.id == Attendance.member_id).where(Class.id == class_id).group_by(Class.id, Class.version))).first()
+    return etag("c", class_id, *row) if row != None else None
+
+async def lookup_trainer_etag(db: AsyncSession, trainer_id: int, expand: frozenset[str] = frozenset()) -> str | None:
+    trainer_version = (await db.exec(select(Trainer.version).where(Trainer.id == trainer_id))).first()
+    if trainer_version == None:
+        return None
+    parts = [trainer_version]
+    if "classes" in expand:
+        parts.append((await db.exec(select(func.coalesce(func.sum(Class.version), 0)).where(Class.trainer_id == trainer_id))).one())
+    if "classes.members" in expand:
+        parts.append((await db.exec(select(func.coalesce(func.sum(Member.version), 0)).join(Attendance, Attendance.member_id == Member.id).join(Class, Class.id == Attendance.class_id).where(Class.trainer_id == trainer_id))).one())
+    return etag("t", trainer_id, *parts)
+
+def check_if_match(header: str, current: str | None):
+    # Optimistic concurrency for PATCH: a stale If-Match means someone else changed the row first. current
+    # is the unexpanded ETag, and an ETag fetched with any ?expand= extends it, so either is accepted.
+    # Unlike If-None-Match, If-Match uses the strong comparison, so a weak W/ tag never matches.
+    # Only a check; update_checked makes it stick.
+    if current == None:
+        return
+    tags = [tag.strip() for tag in header.split(",")]
+    if not any(tag == "*" or tag == current or tag.startswith(current[:-1] + "-") for tag in tags):
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Resource has changed since it was fetched")
+
+async def update_checked(db: AsyncSession, row, values: dict, if_match: str | None):
+    # Writes a PATCH and bumps the row's version in one UPDATE. With If-Match it only applies to the version
+    # loaded (and checked) in this transaction: Postgres holds the row lock from then on, but SQLite takes
+    # none, so of two PATCHes that sent the same ETag the second would otherwise overwrite the first
+    model = type(row)
+    where = [model.id == row.id] if if_match == None else [model.id == row.id, model.version == row.version]
+    if (await db.exec(update(model).where(*where).values(**values, version=model.version + 1).returning(model.id))).first() == None:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Resource has changed since it was fetched")
+
+def bump_statement(model, condition):
+    # Postgres locks an UPDATE's rows in whatever order it finds them, so two transactions bumping overlapping
+    # sets (two bulk creates sharing trainers) could each hold a row the other waits on. Locking them in id
+    # order first makes them queue instead; SQLite has no row locks and leaves out the FOR UPDATE.
+    return update(model).where(model.id.in_(select(model.id).where(condition).order_by(model.id).with_for_update())).values(version=model.version + 1)
+
+async def bump(db: AsyncSession, model, condition):
+    await db.exec(bump_statement(model, condition))
+
+async def bump_returning_ids(db: AsyncSession, model, condition) -> list[int]:
+    # For when the bumped rows' cached responses have to be invalidated too
+    return (await db.exec(bump_statement(model, condition).returning(model.id))).scalars().all()